@@ -0,0 +1,117 @@
+"""
+Compare gunicorn worker profiles (see gunicorn.conf.py) under the same load.
+
+For every profile a gunicorn server is started on the seeded benchmark
+database (python bench/suite.py seed), driven over HTTP by bench/suite.py run
+with concurrent clients, and stopped. Reports each profile's suite results,
+the seconds until /readyz answers and the total PSS (memory, shared pages
+counted once) of the master and its workers at the end of the run:
+    $ python bench/gunicorn_profiles.py --concurrency 16 --requests 300 --output profiles.json
+    $ python bench/gunicorn_profiles.py --profiles sync gthread --only list single
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_DATABASE = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'starwars_bench.db')
+PROFILES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'gthread-no-preload': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_PRELOAD': '0'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_ready(url, deadline=30):
+    started = time.time()
+    while time.time() - started < deadline:
+        try:
+            with urllib.request.urlopen(url + '/readyz') as response:
+                if response.status == 200:
+                    return time.time() - started
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not become ready at %s' % url)
+
+def tree_pss_kb(pid):
+    """
+    Proportional set size of a process and all of its children: pages shared
+    copy-on-write by the preloaded workers are counted once, unlike RSS
+    """
+    total = 0
+    with open('/proc/%d/smaps_rollup' % pid) as smaps:
+        for line in smaps:
+            if line.startswith('Pss:'):
+                total += int(line.split()[1])
+    for task in os.listdir('/proc/%d/task' % pid):
+        with open('/proc/%d/task/%s/children' % (pid, task)) as children:
+            total += sum(tree_pss_kb(int(child)) for child in children.read().split())
+    return total
+
+def run_profile(name, options):
+    port = free_port()
+    url = 'http://127.0.0.1:%d' % port
+    env = dict(os.environ, PORT=str(port), **PROFILES[name])
+    env.setdefault('DATABASE_URL', DEFAULT_DATABASE)
+    if options.workers:
+        env['WEB_CONCURRENCY'] = str(options.workers)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi', '--chdir', './src/'],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        ready_seconds = wait_ready(url)
+        command = [sys.executable, os.path.join(ROOT, 'bench', 'suite.py'), 'run', '--url', url,
+                   '--concurrency', str(options.concurrency), '--requests', str(options.requests),
+                   '--people', str(options.people), '--planets', str(options.planets), '--users', str(options.users)]
+        if options.only:
+            command += ['--only'] + options.only
+        report = json.loads(subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout)
+        report.update({'profile': name, 'ready_seconds': round(ready_seconds, 2), 'total_pss_kb': tree_pss_kb(server.pid)})
+        return report
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='*', default=['sync', 'gthread', 'gthread-no-preload', 'gevent'],
+                        choices=list(PROFILES))
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY for every profile, default from the CPUs')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=300, help='requests per scenario')
+    parser.add_argument('--people', type=int, default=10000, help='as seeded')
+    parser.add_argument('--planets', type=int, default=1000, help='as seeded')
+    parser.add_argument('--users', type=int, default=1000, help='as seeded')
+    parser.add_argument('--only', nargs='*', help='suite scenarios to run, see bench/suite.py')
+    parser.add_argument('--output', help='also write the report to this file')
+    options = parser.parse_args()
+    reports = []
+    for name in options.profiles:
+        if name == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print('skipping gevent, not installed', file=sys.stderr)
+                continue
+        reports.append(run_profile(name, options))
+        summary = {result['scenario']: result['requests_per_second'] for result in reports[-1]['results']}
+        print(json.dumps({'profile': name, 'total_pss_kb': reports[-1]['total_pss_kb'],
+                          'requests_per_second': summary}), file=sys.stderr)
+    output = json.dumps({'profiles': reports}, indent=2)
+    if options.output:
+        with open(options.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    print(output)
@@ -0,0 +1,116 @@
+"""
+Microbenchmark of the compiled model schemas (src/schemas.py) against the
+paths they replace, on a People table of --rows rows:
+
+- serialize: the former hand-written People.serialize() against the
+  compiled People.serialize (one attrgetter) on the same ORM instances
+- reject: a body with a bad type going through the former handler path
+  (ORM insert, failing inside commit(), rollback) against the compiled
+  validator rejecting it before any query
+- validate: a valid body checked by reading the column metadata on every
+  request against the compiled checks
+
+$ python bench/schemas.py [--rows 10000] [--repeat 5] [--bodies 2000] [--commits 100]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from app import app
+from models import db, People, Planets
+
+BAD_BODY = {'name': 'bad person', 'birth_year': None, 'gender': 'male', 'height': '172', 'hair_color': 'blond'}
+GOOD_BODY = {'name': 'good person', 'birth_year': '19BBY', 'gender': 'male', 'height': '172',
+             'hair_color': 'blond', 'homeworld_id': 1, 'picture_url': 'https://example.com/1.jpg'}
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(Planets.__table__), [{'planet_name': 'planet 1', 'gravity': '1 standard'}])
+    db.session.execute(db.insert(People.__table__), [
+        {'name': 'person %d' % i, 'birth_year': '%dBBY' % (i % 100), 'gender': 'male', 'height': '172',
+         'hair_color': 'blond', 'homeworld_id': 1, 'picture_url': 'https://example.com/%d.jpg' % i}
+        for i in range(rows)])
+    db.session.commit()
+
+def legacy_serialize(person):
+    # People.serialize() as it was written by hand
+    return {
+        "id": person.id,
+        "name": person.name,
+        "birth_year": person.birth_year,
+        "gender": person.gender,
+        "height": person.height,
+        "hair_color": person.hair_color,
+        "homeworld": person.homeworld,
+        "homeworld_id": person.homeworld_id,
+        "picture_url": person.picture_url
+    }
+
+def legacy_reject(bodies):
+    # no validation: the body reaches the database and fails inside commit()
+    for body in bodies:
+        db.session.add(People(**{name: body.get(name) for name in People.schema.fields}))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+def metadata_errors(body):
+    # the checks rebuilt from the column metadata on every request
+    errors = {}
+    for column in People.__table__.columns:
+        if column.key not in People.schema.fields:
+            continue
+        value = body.get(column.key)
+        if value is None:
+            if not column.nullable:
+                errors[column.key] = 'can not be null'
+        elif column.type.python_type is int and (not isinstance(value, int) or isinstance(value, bool)):
+            errors[column.key] = 'must be an integer'
+        elif column.type.python_type is str and (not isinstance(value, str) or len(value) > column.type.length):
+            errors[column.key] = 'must be a string'
+    return errors
+
+def measure(name, function, count, repeat):
+    best = min(_timed(function) for _ in range(repeat))
+    print(json.dumps({'path': name, 'count': count, 'seconds': round(best, 4), 'per_second': round(count / best)}))
+
+def _timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--bodies', type=int, default=2000, help='request bodies validated per run')
+    parser.add_argument('--commits', type=int, default=100, help='bad bodies sent to the database per run')
+    options = parser.parse_args()
+    with app.app_context():
+        seed(options.rows)
+        people = db.session.execute(db.select(People)).unique().scalars().all()
+        measure('serialize handwritten', lambda: [legacy_serialize(person) for person in people],
+                options.rows, options.repeat)
+        measure('serialize compiled', lambda: [person.serialize() for person in people],
+                options.rows, options.repeat)
+        assert [legacy_serialize(person) for person in people] == [person.serialize() for person in people]
+
+        bad = [BAD_BODY] * options.commits
+        measure('reject in commit', lambda: legacy_reject(bad), options.commits, options.repeat)
+        bad = [BAD_BODY] * options.bodies
+        measure('reject compiled', lambda: [People.schema.errors(body) for body in bad], options.bodies, options.repeat)
+
+        good = [GOOD_BODY] * options.bodies
+        measure('validate from metadata', lambda: [metadata_errors(body) for body in good],
+                options.bodies, options.repeat)
+        measure('validate compiled', lambda: [People.schema.errors(body) for body in good],
+                options.bodies, options.repeat)
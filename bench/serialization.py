@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the /people serialization paths on a 10k row table:
+ORM instances + serialize() + stdlib JSON (the old path) against Core rows
+with the stdlib and the orjson providers.
+
+$ python bench/serialization.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from flask.json.provider import DefaultJSONProvider
+from app import app
+from models import db, People
+from json_provider import OrjsonProvider, orjson
+from utils import list_query, page_result
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(People.__table__), [
+        {'name': 'person %d' % i, 'birth_year': '%dBBY' % (i % 100), 'gender': 'male', 'height': '172',
+         'hair_color': 'blond', 'picture_url': 'https://example.com/%d.jpg' % i}
+        for i in range(rows)])
+    db.session.commit()
+
+def orm_stdlib(rows):
+    people = db.session.execute(db.select(People).limit(rows)).scalars().all()
+    body = json.dumps({'msg': 'ok', 'people': [person.serialize() for person in people]}, sort_keys=True)
+    db.session.expunge_all()
+    return body
+
+def core_rows(provider, rows):
+    with app.test_request_context('/people'):
+        page, cursor = page_result(db.session.execute(list_query(People, [], []).limit(rows + 1)), rows)
+        return provider.dumps({'msg': 'ok', 'people': page, 'next': cursor})
+
+def measure(name, function, rows, repeat):
+    best = min(_timed(function) for _ in range(repeat))
+    print(json.dumps({'path': name, 'rows': rows, 'seconds': round(best, 4), 'rows_per_second': round(rows / best)}))
+
+def _timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+    with app.app_context():
+        seed(options.rows)
+        measure('orm+serialize+stdlib', lambda: orm_stdlib(options.rows), options.rows, options.repeat)
+        stdlib = DefaultJSONProvider(app)
+        measure('core+stdlib', lambda: core_rows(stdlib, options.rows), options.rows, options.repeat)
+        if orjson is not None:
+            measure('core+orjson', lambda: core_rows(OrjsonProvider(app), options.rows), options.rows, options.repeat)
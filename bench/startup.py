@@ -0,0 +1,74 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app and to
+answer its first request, in API-only mode (ADMIN_ENABLED=0) and in full mode
+(admin UI and migration commands loaded), each measured in new interpreters:
+    $ python bench/startup.py --runs 10 --output startup.json
+
+Reports the median and max, in milliseconds, of the time to `import app` and
+to the first answered GET /healthz and GET /people, counted from the first
+line of the worker, and the worker's peak RSS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+DEFAULT_DATABASE = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'starwars_bench.db')
+MODES = {
+    'api': {'ADMIN_ENABLED': '0', 'MIGRATIONS_ENABLED': '0'},
+    'full': {'ADMIN_ENABLED': '1', 'MIGRATIONS_ENABLED': '1'},
+}
+
+# runs in the measured interpreter, prints its timings as JSON
+WORKER = """
+import json, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, %r)
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+client.get('/healthz')
+healthy = time.perf_counter()
+client.get('/people')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'first_healthz_ms': (healthy - started) * 1000,
+                  'first_people_ms': (served - started) * 1000,
+                  'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def measure(mode, runs):
+    env = dict(os.environ, **MODES[mode])
+    env.setdefault('DATABASE_URL', DEFAULT_DATABASE)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', WORKER % SRC], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {'mode': mode, 'runs': runs}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        result[key] = {'median': round(statistics.median(values), 1), 'max': round(max(values), 1)}
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--modes', nargs='*', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--output', help='also write the report to this file')
+    options = parser.parse_args()
+    report = {'results': []}
+    for mode in options.modes:
+        report['results'].append(measure(mode, options.runs))
+        print(json.dumps(report['results'][-1]), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    print(output)
@@ -0,0 +1,267 @@
+"""
+Benchmark and load-test suite for the REST API.
+
+Seed a database with synthetic data (SQLite by default, or DATABASE_URL):
+    $ python bench/suite.py seed --people 10000 --planets 1000 --users 1000 --favorites 20
+
+Drive every route in process through the Flask test client, or over real HTTP
+against a running server (gunicorn, uvicorn asgi:application, ...) with
+concurrent connections:
+    $ python bench/suite.py run --output before.json
+    $ python bench/suite.py run --url http://localhost:3000 --concurrency 16 --server-pid 1234 --output after.json
+
+Each scenario reports requests/sec, p50/p95/p99 latency, SQL statements per
+request (read from the Server-Timing header), response bytes and the peak RSS
+of the process serving the requests, as JSON. Pass --accept-encoding "br, gzip"
+to measure compressed responses. Compare two runs:
+    $ python bench/suite.py compare before.json after.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+DEFAULT_DATABASE = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'starwars_bench.db')
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def load_app():
+    sys.path.insert(0, SRC)
+    os.environ.setdefault('DATABASE_URL', DEFAULT_DATABASE)
+    from app import app
+    return app
+
+def seed(options):
+    app = load_app()
+    from models import db, rebuild_favorite_counts, User, People, Planets, FavoritePeople, FavoritePlanets
+    rng = random.Random(options.seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert = lambda model, rows: db.session.execute(db.insert(model.__table__), rows)
+        insert(Planets, [{'planet_name': 'planet %d' % i, 'population': str(rng.randint(0, 10 ** 9)),
+                          'climate': rng.choice(['arid', 'temperate', 'tropical', 'frozen']),
+                          'diameter': rng.randint(1000, 20000), 'gravity': '1 standard',
+                          'picture_url': 'https://example.com/planets/%d.jpg' % i}
+                         for i in range(options.planets)])
+        insert(People, [{'name': 'person %d' % i, 'birth_year': '%dBBY' % rng.randint(0, 900),
+                         'gender': rng.choice(['male', 'female', 'n/a']), 'height': str(rng.randint(60, 250)),
+                         'hair_color': rng.choice(['blond', 'brown', 'black', 'none']),
+                         'homeworld_id': rng.randint(1, options.planets),
+                         'picture_url': 'https://example.com/people/%d.jpg' % i}
+                        for i in range(options.people)])
+        insert(User, [{'email': 'user%d@example.com' % i, 'user_name': 'user%d' % i, 'full_name': 'User %d' % i,
+                       'password': 'secret', 'is_active': True}
+                      for i in range(options.users)])
+        planet_favorites, people_favorites = [], []
+        for user_id in range(1, options.users + 1):
+            for planet_id in rng.sample(range(1, options.planets + 1), min(options.favorites, options.planets)):
+                planet_favorites.append({'user_fav_id': user_id, 'planet_fav_id': planet_id})
+            for people_id in rng.sample(range(1, options.people + 1), min(options.favorites, options.people)):
+                people_favorites.append({'user_fav_id': user_id, 'people_fav_id': people_id})
+        insert(FavoritePlanets, planet_favorites)
+        insert(FavoritePeople, people_favorites)
+        rebuild_favorite_counts()
+        db.session.commit()
+    print(json.dumps({'seeded': vars(options)}))
+
+
+def scenarios(options, rng):
+    """ (name, method, path factory, json body factory) for every route """
+    people_id = lambda: rng.randint(1, options.people)
+    planet_id = lambda: rng.randint(1, options.planets)
+    user_id = lambda: rng.randint(1, options.users)
+    counter = iter(range(10 ** 9))
+    return [
+        ('sitemap', 'GET', lambda: '/', None),
+        ('readiness', 'GET', lambda: '/readyz', None),
+        ('list people', 'GET', lambda: '/people', None),
+        ('planet residents', 'GET', lambda: '/planets/%d/residents' % planet_id(), None),
+        ('list people projected', 'GET', lambda: '/people?fields=name,homeworld&limit=500', None),
+        ('list planets', 'GET', lambda: '/planets', None),
+        ('list users', 'GET', lambda: '/users', None),
+        ('single person', 'GET', lambda: '/people/%d' % people_id(), None),
+        ('single planet', 'GET', lambda: '/planets/%d' % planet_id(), None),
+        ('single user', 'GET', lambda: '/users/%d' % user_id(), None),
+        ('top favorite people', 'GET', lambda: '/stats/favorites/top?kind=people&limit=10', None),
+        ('user favorites', 'GET', lambda: '/user/favorites?user_id=%d' % user_id(), None),
+        ('add person', 'POST', lambda: '/people',
+         lambda: {'name': 'bench person %d-%d' % (os.getpid(), next(counter)), 'birth_year': '1BBY'}),
+        ('favorite planet', 'POST', lambda: '/favorite/planet/%d' % planet_id(),
+         lambda: {'current_user_id': user_id()}),
+        ('replace favorites', 'PUT', lambda: '/users/%d/favorites' % user_id(),
+         lambda: {'planets': [planet_id() for _ in range(options.favorites)],
+                  'people': [people_id() for _ in range(options.favorites)]}),
+        ('unfavorite planet', 'DELETE', lambda: '/favorite/planet/%d' % planet_id(),
+         lambda: {'current_user_id': user_id()}),
+    ]
+
+
+class TestClientDriver:
+    def __init__(self, accept_encoding=None):
+        self.client = load_app().test_client()
+        self.headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body, headers=self.headers)
+        size = len(response.get_data())
+        response.close()
+        return response.status_code, response.headers.get('Server-Timing', ''), size
+
+
+class HTTPDriver:
+    def __init__(self, url, accept_encoding=None):
+        self.url = url.rstrip('/')
+        self.headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = dict(self.headers)
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                size = len(response.read())
+                return response.status, response.headers.get('Server-Timing', ''), size
+        except HTTPError as error:
+            return error.code, error.headers.get('Server-Timing', ''), len(error.read())
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def peak_rss_kb(pid):
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open('/proc/%d/status' % pid) as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return None
+
+def run_scenario(driver, scenario, requests, concurrency):
+    name, method, path, body = scenario
+    latencies, queries, sizes, errors = [], [], [], [0]
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            status, timing, size = driver.request(method, path(), body() if body else None)
+            elapsed = time.perf_counter() - started
+            match = QUERIES.search(timing)
+            with lock:
+                latencies.append(elapsed)
+                sizes.append(size)
+                if match:
+                    queries.append(int(match.group(1)))
+                if status >= 500:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'bytes_per_response': round(sum(sizes) / len(sizes)) if sizes else None,
+    }
+
+def run(options):
+    rng = random.Random(options.seed)
+    if options.url:
+        driver = HTTPDriver(options.url, options.accept_encoding)
+    else:
+        driver = TestClientDriver(options.accept_encoding)
+        options.concurrency = 1  # the test client shares one session, run it serially
+    selected = [scenario for scenario in scenarios(options, rng)
+                if not options.only or any(word in scenario[0] for word in options.only)]
+    results = []
+    for scenario in selected:
+        run_scenario(driver, scenario, options.warmup, options.concurrency)
+        results.append(run_scenario(driver, scenario, options.requests, options.concurrency))
+        print(json.dumps(results[-1]), file=sys.stderr)
+    report = {
+        'mode': 'http' if options.url else 'test-client',
+        'url': options.url,
+        'concurrency': options.concurrency,
+        'accept_encoding': options.accept_encoding,
+        'requests_per_scenario': options.requests,
+        'peak_rss_kb': peak_rss_kb(options.server_pid if options.url else None),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    print(output)
+
+
+def compare(options):
+    with open(options.before) as before_file, open(options.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    previous = {result['scenario']: result for result in before['results']}
+    rows = []
+    for result in after['results']:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        row = {'scenario': result['scenario']}
+        for key in ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'bytes_per_response'):
+            if old.get(key) is None or result.get(key) is None:
+                continue
+            change = (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            row[key] = {'before': old[key], 'after': result[key], 'change_pct': round(change, 1)}
+        rows.append(row)
+    print(json.dumps({'peak_rss_kb': {'before': before['peak_rss_kb'], 'after': after['peak_rss_kb']},
+                      'scenarios': rows}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('seed', 'run'):
+        command = commands.add_parser(name)
+        command.add_argument('--people', type=int, default=10000)
+        command.add_argument('--planets', type=int, default=1000)
+        command.add_argument('--users', type=int, default=1000)
+        command.add_argument('--favorites', type=int, default=20, help='favorites of each kind per user')
+        command.add_argument('--seed', type=int, default=42)
+    run_parser = commands.choices['run']
+    run_parser.add_argument('--url', help='benchmark a running server instead of the Flask test client')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=20)
+    run_parser.add_argument('--server-pid', type=int, help='pid of the server, to report its peak RSS')
+    run_parser.add_argument('--accept-encoding', help='Accept-Encoding sent with every request, e.g. "br, gzip"')
+    run_parser.add_argument('--only', nargs='*', help='run the scenarios whose name contains one of these words')
+    run_parser.add_argument('--output', help='also write the report to this file')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    options = parser.parse_args()
+    {'seed': seed, 'run': run, 'compare': compare}[options.command](options)
@@ -0,0 +1,97 @@
+"""
+Gunicorn settings, picked up from the repository root by Procfile and render.yaml:
+    $ gunicorn -c gunicorn.conf.py wsgi --chdir ./src/
+
+Environment:
+GUNICORN_WORKER_CLASS   sync, gthread (default) or gevent (pipenv install gevent)
+WEB_CONCURRENCY         worker processes, default 2 * CPUs + 1 for sync and
+                        CPUs + 1 for gthread/gevent, which serve many requests each
+GUNICORN_THREADS        threads per gthread worker (default 4), also the default
+                        DB_POOL_SIZE so every thread can hold a connection
+GUNICORN_CONNECTIONS    concurrent requests per gevent worker (default 100)
+GUNICORN_PRELOAD        import the app once in the master and fork the workers
+                        from it, sharing its memory copy-on-write (default 1)
+GUNICORN_MAX_REQUESTS   recycle a worker after this many requests, 0 disables
+                        (default 1000), plus up to GUNICORN_MAX_REQUESTS_JITTER
+                        (default 100) so the workers do not restart together
+GUNICORN_KEEPALIVE      seconds an idle keep-alive connection is held (default 5),
+                        unused by sync workers
+GUNICORN_TIMEOUT        seconds before a silent worker is killed (default 30)
+PROMETHEUS_MULTIPROC_DIR  where the workers keep their metrics so /metrics
+                        reports all of them (default a new directory in
+                        /dev/shm), emptied when the server starts
+
+With preload the master opens no database connection, but the engine and
+its pool are created there: post_fork disposes of the copy each worker
+inherits so no connection is ever shared across processes.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+import tempfile
+
+cpus = multiprocessing.cpu_count()
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+    except ImportError:
+        sys.stderr.write('gevent is not installed, using gthread workers\n')
+        worker_class = 'gthread'
+    else:
+        # before the app is preloaded, so its sockets and locks are cooperative
+        monkey.patch_all()
+
+if worker_class == 'sync':
+    workers = int(os.getenv('WEB_CONCURRENCY', cpus * 2 + 1))
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', cpus + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_CONNECTIONS', 100))
+os.environ.setdefault('DB_POOL_SIZE', str(threads if worker_class != 'gevent' else 10))
+
+bind = '0.0.0.0:%s' % os.getenv('PORT', '3000')
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes', 'on')
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+if os.path.isdir('/dev/shm'):
+    # the worker heartbeat file, on tmpfs so a slow disk never stalls it
+    worker_tmp_dir = '/dev/shm'
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    # before the app imports prometheus_client, which reads it on import
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='prometheus-',
+                                                              dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+
+def on_starting(server):
+    # the counters start over with the server, drop the files of a previous run
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
+
+
+def pre_fork(server, worker):
+    # move the preloaded objects out of the collector's reach, a collection
+    # in a worker would otherwise touch (and copy) every page of them
+    gc.collect()
+    gc.freeze()
+
+def child_exit(server, worker):
+    # the counters of an exited worker stay in the sums, its live gauges do not
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_fork(server, worker):
+    app_module = sys.modules.get('app')
+    if app_module is None:
+        return  # not preloaded, the worker creates its own engine
+    from models import db
+    with app_module.app.app_context():
+        # close=False: leave the parent's connections alone, only forget them
+        db.engine.dispose(close=False)
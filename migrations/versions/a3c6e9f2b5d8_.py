@@ -0,0 +1,32 @@
+"""empty message
+
+Revision ID: a3c6e9f2b5d8
+Revises: f2b5c8d1e4a7
+Create Date: 2026-10-18 19:12:30.402115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c6e9f2b5d8'
+down_revision = 'f2b5c8d1e4a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # favorites of items deleted before their favorites were deleted with them
+    op.execute('DELETE FROM favorite_people WHERE people_fav_id IS NULL')
+    op.execute('DELETE FROM favorite_planets WHERE planet_fav_id IS NULL')
+    # and their counters, possibly inherited by an item that reused the id
+    op.execute('DELETE FROM favorite_count')
+    op.execute("INSERT INTO favorite_count (kind, item_id, favorites) "
+               "SELECT 'people', people_fav_id, count(*) FROM favorite_people GROUP BY people_fav_id")
+    op.execute("INSERT INTO favorite_count (kind, item_id, favorites) "
+               "SELECT 'planets', planet_fav_id, count(*) FROM favorite_planets GROUP BY planet_fav_id")
+
+
+def downgrade():
+    pass
@@ -0,0 +1,57 @@
+"""empty message
+
+Revision ID: b2e8c4f1d7a3
+Revises: 9c5d2e8f4a61
+Create Date: 2026-10-18 13:02:18.446190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8c4f1d7a3'
+down_revision = '9c5d2e8f4a61'
+branch_labels = None
+depends_on = None
+
+PEOPLE_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(homeworld, ''))"
+PLANETS_DOCUMENT = "to_tsvector('simple', coalesce(planet_name, '') || ' ' || coalesce(climate, ''))"
+
+
+def upgrade():
+    # search indexes, see src/search.py
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE INDEX ix_people_search ON people USING gin (%s)' % PEOPLE_DOCUMENT)
+        op.execute('CREATE INDEX ix_planets_search ON planets USING gin (%s)' % PLANETS_DOCUMENT)
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5(name, extra, tokenize='unicode61')")
+        op.execute("INSERT INTO search_index(rowid, name, extra) SELECT id * 2, name, homeworld FROM people")
+        op.execute("INSERT INTO search_index(rowid, name, extra) SELECT id * 2 + 1, planet_name, climate FROM planets")
+        op.execute("CREATE TRIGGER people_search_insert AFTER INSERT ON people BEGIN "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, new.homeworld); END")
+        op.execute("CREATE TRIGGER people_search_update AFTER UPDATE ON people BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2; "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, new.homeworld); END")
+        op.execute("CREATE TRIGGER people_search_delete AFTER DELETE ON people BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2; END")
+        op.execute("CREATE TRIGGER planets_search_insert AFTER INSERT ON planets BEGIN "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2 + 1, new.planet_name, new.climate); END")
+        op.execute("CREATE TRIGGER planets_search_update AFTER UPDATE ON planets BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2 + 1, new.planet_name, new.climate); END")
+        op.execute("CREATE TRIGGER planets_search_delete AFTER DELETE ON planets BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; END")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX ix_planets_search')
+        op.execute('DROP INDEX ix_people_search')
+    elif dialect == 'sqlite':
+        for trigger in ('people_search_insert', 'people_search_update', 'people_search_delete',
+                        'planets_search_insert', 'planets_search_update', 'planets_search_delete'):
+            op.execute('DROP TRIGGER %s' % trigger)
+        op.execute('DROP TABLE search_index')
@@ -0,0 +1,114 @@
+"""empty message
+
+Revision ID: c7f3a9d2e5b8
+Revises: b2e8c4f1d7a3
+Create Date: 2026-10-18 14:15:33.120874
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f3a9d2e5b8'
+down_revision = 'b2e8c4f1d7a3'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+# homeworld values meaning no homeworld (docs/people.csv has 'unknown'), left NULL
+PLACEHOLDERS = "lower(homeworld) NOT IN ('unknown', 'n/a')"
+
+HOMEWORLD_NAME = '(SELECT planet_name FROM planets WHERE planets.id = new.homeworld_id)'
+# rebuilding people on SQLite drops its triggers, they are all recreated
+SQLITE_PEOPLE_TRIGGERS = ('people_search_insert', 'people_search_update', 'people_search_delete')
+SQLITE_PEOPLE_DELETE = ("CREATE TRIGGER people_search_delete AFTER DELETE ON people BEGIN "
+                        "DELETE FROM search_index WHERE rowid = old.id * 2; END")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('homeworld_id', sa.Integer(), nullable=True))
+
+    # no homeworld name is lost with the column: those naming no planet become one,
+    # like `flask catalog import` does
+    missing = [name for name, in op.get_bind().execute(sa.text(
+        "SELECT DISTINCT homeworld FROM people WHERE homeworld IS NOT NULL AND homeworld <> '' AND %s "
+        "AND NOT EXISTS (SELECT 1 FROM planets WHERE planets.planet_name = people.homeworld)" % PLACEHOLDERS))]
+    if missing:
+        logger.warning('creating %d planets for the homeworlds naming no planet: %s',
+                       len(missing), ', '.join(sorted(missing)))
+        op.bulk_insert(sa.table('planets', sa.column('planet_name', sa.String)),
+                       [{'planet_name': name} for name in sorted(missing)])
+        op.execute("UPDATE table_version SET version = version + 1 WHERE name = 'planets'")
+
+    op.execute('UPDATE people SET homeworld_id = '
+               '(SELECT planets.id FROM planets WHERE planets.planet_name = people.homeworld) WHERE %s' % PLACEHOLDERS)
+
+    # the search triggers and index read people.homeworld, replace them around dropping it
+    if dialect == 'sqlite':
+        for trigger in SQLITE_PEOPLE_TRIGGERS:
+            op.execute('DROP TRIGGER %s' % trigger)
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX ix_people_search')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.drop_index('ix_people_homeworld')
+        batch_op.create_index(batch_op.f('ix_people_homeworld_id'), ['homeworld_id'], unique=False)
+        batch_op.create_foreign_key('people_homeworld_id_fkey', 'planets', ['homeworld_id'], ['id'], ondelete='SET NULL')
+        batch_op.drop_column('homeworld')
+
+    # ### end Alembic commands ###
+
+    if dialect == 'sqlite':
+        op.execute("CREATE TRIGGER people_search_insert AFTER INSERT ON people BEGIN "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, %s); END" % HOMEWORLD_NAME)
+        op.execute("CREATE TRIGGER people_search_update AFTER UPDATE ON people BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2; "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, %s); END" % HOMEWORLD_NAME)
+        op.execute(SQLITE_PEOPLE_DELETE)
+        op.execute("CREATE TRIGGER planets_search_rename AFTER UPDATE OF planet_name ON planets BEGIN "
+                   "DELETE FROM search_index WHERE rowid IN (SELECT id * 2 FROM people WHERE homeworld_id = new.id); "
+                   "INSERT INTO search_index(rowid, name, extra) "
+                   "SELECT id * 2, name, new.planet_name FROM people WHERE homeworld_id = new.id; END")
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_people_search ON people USING gin (to_tsvector('simple', coalesce(name, '')))")
+        op.execute("CREATE INDEX ix_planets_name_search ON planets USING gin "
+                   "(to_tsvector('simple', coalesce(planet_name, '')))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in SQLITE_PEOPLE_TRIGGERS + ('planets_search_rename',):
+            op.execute('DROP TRIGGER %s' % trigger)
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX ix_planets_name_search')
+        op.execute('DROP INDEX ix_people_search')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('homeworld', sa.VARCHAR(length=25), nullable=True))
+        batch_op.drop_constraint('people_homeworld_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_people_homeworld_id'))
+        batch_op.create_index('ix_people_homeworld', ['homeworld'], unique=False)
+
+    # ### end Alembic commands ###
+    op.execute('UPDATE people SET homeworld = '
+               '(SELECT planets.planet_name FROM planets WHERE planets.id = people.homeworld_id)')
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.drop_column('homeworld_id')
+
+    if dialect == 'sqlite':
+        op.execute("CREATE TRIGGER people_search_insert AFTER INSERT ON people BEGIN "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, new.homeworld); END")
+        op.execute("CREATE TRIGGER people_search_update AFTER UPDATE ON people BEGIN "
+                   "DELETE FROM search_index WHERE rowid = old.id * 2; "
+                   "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, new.homeworld); END")
+        op.execute(SQLITE_PEOPLE_DELETE)
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_people_search ON people USING gin "
+                   "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(homeworld, '')))")
@@ -0,0 +1,56 @@
+"""empty message
+
+Revision ID: d4f7a1c8e6b9
+Revises: a3c6e9f2b5d8
+Create Date: 2026-10-18 21:04:17.553208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f7a1c8e6b9'
+down_revision = 'a3c6e9f2b5d8'
+branch_labels = None
+depends_on = None
+
+# PostgreSQL only: people are searched on one tsvector of their name and
+# homeworld name together, like the SQLite search_index row
+HOMEWORLD_NAME = '(SELECT planet_name FROM planets WHERE planets.id = %s.homeworld_id)'
+PEOPLE_DOCUMENT = "to_tsvector('simple', coalesce(%s.name, '') || ' ' || coalesce(%s, ''))"
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.add_column('people', sa.Column('search_document', postgresql.TSVECTOR(), nullable=True))
+    op.execute('UPDATE people SET search_document = %s' % (PEOPLE_DOCUMENT % ('people', HOMEWORLD_NAME % 'people')))
+    op.execute("CREATE FUNCTION people_search_document() RETURNS trigger AS $$ BEGIN "
+               "new.search_document := %s; RETURN new; END $$ LANGUAGE plpgsql"
+               % (PEOPLE_DOCUMENT % ('new', HOMEWORLD_NAME % 'new')))
+    op.execute('CREATE TRIGGER people_search_document BEFORE INSERT OR UPDATE OF name, homeworld_id ON people '
+               'FOR EACH ROW EXECUTE FUNCTION people_search_document()')
+    op.execute("CREATE FUNCTION planets_search_rename() RETURNS trigger AS $$ BEGIN "
+               "UPDATE people SET search_document = %s WHERE homeworld_id = new.id; "
+               "RETURN NULL; END $$ LANGUAGE plpgsql" % (PEOPLE_DOCUMENT % ('people', 'new.planet_name')))
+    op.execute('CREATE TRIGGER planets_search_rename AFTER UPDATE OF planet_name ON planets '
+               'FOR EACH ROW EXECUTE FUNCTION planets_search_rename()')
+    op.execute('DROP INDEX ix_people_search')
+    op.execute('DROP INDEX ix_planets_name_search')
+    op.execute('CREATE INDEX ix_people_search ON people USING gin (search_document)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX ix_people_search')
+    op.execute('DROP TRIGGER planets_search_rename ON planets')
+    op.execute('DROP FUNCTION planets_search_rename()')
+    op.execute('DROP TRIGGER people_search_document ON people')
+    op.execute('DROP FUNCTION people_search_document()')
+    op.drop_column('people', 'search_document')
+    op.execute("CREATE INDEX ix_people_search ON people USING gin (to_tsvector('simple', coalesce(name, '')))")
+    op.execute("CREATE INDEX ix_planets_name_search ON planets USING gin "
+               "(to_tsvector('simple', coalesce(planet_name, '')))")
@@ -0,0 +1,32 @@
+"""empty message
+
+Revision ID: f2b5c8d1e4a7
+Revises: e1a4b7c9d2f3
+Create Date: 2026-10-18 17:41:09.218554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b5c8d1e4a7'
+down_revision = 'e1a4b7c9d2f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # plain ALTER TABLE ... ADD COLUMN, not a batch rebuild that would drop the search triggers
+    op.add_column('people', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('planets', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        # ALTER TABLE ... DROP COLUMN, SQLite 3.35 and later
+        op.execute('ALTER TABLE planets DROP COLUMN version_id')
+        op.execute('ALTER TABLE people DROP COLUMN version_id')
+    else:
+        op.drop_column('planets', 'version_id')
+        op.drop_column('people', 'version_id')
@@ -2,82 +2,146 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 """
-PSQL commands to populate database from CSV files in /docs
-\COPY 'user' FROM '/workspaces/Anajerar_latampt36_Starwars_rest_API/docs/user.csv' DELIMITER ',' CSV HEADER;
-\COPY 'panets' FROM '/workspaces/Anajerar_latampt36_Starwars_rest_API/docs/planets.csv' DELIMITER ',' CSV HEADER;
-\COPY 'people' FROM '/workspaces/Anajerar_latampt36_Starwars_rest_API/docs/people.csv' DELIMITER ',' CSV HEADER;
-\COPY 'favorite_planets' FROM '/workspaces/Anajerar_latampt36_Starwars_rest_API/docs/favorite_planets.csv' DELIMITER ',' CSV HEADER;
-\COPY 'favorite_people' FROM '/workspaces/Anajerar_latampt36_Starwars_rest_API/docs/favorite_people.csv' DELIMITER ',' CSV HEADER;
+Populate the database from the CSV files in /docs with:
+$ flask catalog import docs/
+
+create_app() builds the app; the endpoints live in the api blueprint. The
+Flask-Admin UI (ADMIN_ENABLED, default 1) and the Flask-Migrate `flask db`
+commands (MIGRATIONS_ENABLED, default on only under the flask CLI) are
+imported and set up only when enabled, so API workers can run with
+ADMIN_ENABLED=0 and boot faster. wsgi_admin.py serves the admin on its own.
 """
 
 
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, Blueprint, current_app, request, jsonify, url_for
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, People, Planets, FavoritePeople, FavoritePlanets
+from utils import APIException, paginate, page_limit, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, next_page_url, wants_stream, stream_rows, batch_items, batch_upsert, id_lists, validated
+from commands import catalog_cli
+from cache import cache
+from compression import compressor
+from conditional import conditional, if_match, item_etag
+from pool import engine_options, env_flag, pool_metrics
+from json_provider import init_json
+from metrics import request_metrics
+from search import search
+from sitemap import sitemap_pages
+from models import db, add_favorite, remove_favorite, update_favorites, update_returning, touch_residents, resolve_homeworlds, top_favorites, FAVORITE_KINDS, User, People, Planets, FavoritePeople, FavoritePlanets
 from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+
+api = Blueprint('api', __name__)
+
 
+def create_app(admin=None, migrations=None):
+    """ Build the app, admin and migrations default to ADMIN_ENABLED and MIGRATIONS_ENABLED """
+    if admin is None:
+        admin = env_flag('ADMIN_ENABLED', '1')
+    if migrations is None:
+        migrations = env_flag('MIGRATIONS_ENABLED', '1' if os.getenv('FLASK_RUN_FROM_CLI') == 'true' else '0')
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    init_json(app)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    db.init_app(app)
+    if migrations:
+        # alembic is the slowest import of the app, only `flask db` needs it
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    pool_metrics.init_app(app, db)
+    request_metrics.init_app(app, db)
+    CORS(app)
+    if admin:
+        from admin import setup_admin
+        setup_admin(app)
+    cache.init_app(app)
+    compressor.init_app(app, cache)
+    sitemap_pages.init_app(app)
+    app.cli.add_command(catalog_cli)
+    app.register_blueprint(api)
+    return app
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+# columns that can be requested with ?fields= on the list endpoints
+USER_FIELDS = ['id', 'email', 'user_name', 'full_name']
+PEOPLE_FIELDS = ['id', 'name', 'birth_year', 'gender', 'height', 'hair_color', 'homeworld', 'homeworld_id', 'picture_url']
+PLANET_FIELDS = ['id', 'planet_name', 'population', 'climate', 'diameter', 'gravity', 'picture_url']
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
-# generate sitemap with all your endpoints
-@app.route('/')
+# generate sitemap with all your endpoints, built once and served precompressed
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return sitemap_pages.html()
+
+@api.route('/routes', methods=['GET'])
+def routes():
+    return sitemap_pages.routes()
+
+# liveness: the process answers, nothing else is checked
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    response = current_app.response_class('ok', mimetype='text/plain')
+    response.cache_control.no_store = True
+    return response
+
+# readiness: a connection from the pool answers SELECT 1
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    try:
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+        response = current_app.response_class('ok', mimetype='text/plain')
+    except Exception as error:
+        current_app.logger.warning('readiness check failed: %s', error)
+        response = current_app.response_class('database unavailable', status=503, mimetype='text/plain')
+    response.cache_control.no_store = True
+    return response
+
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(cache.stats())
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return current_app.response_class(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/people', methods=['POST','PUT'])
+@api.route('/internal/pool', methods=['GET'])
+def pool_stats():
+    return jsonify(pool_metrics.stats())
+
+@api.route('/people', methods=['POST','PUT'])
 def add_people():
-    data = request.json
+    data = request.get_json(silent=True)
     method = request.method
-    name = data.get('name')
-    birth_year = data.get('birth_year')
-    gender = data.get('gender')
-    height = data.get('height')
-    hair_color = data.get('hair_color')
-    homeworld = data.get('homeworld')
-    picture_url = data.get('picture_url')
-
-    people_exist = db.session.execute(db.select(People).filter_by(name=name)).scalars().one_or_none()
+    values = validated(People, data, required=('name',), extra=('homeworld',))
+    name = values.pop('name')
+    # one query resolves a homeworld name and checks a homeworld_id, before the write
+    if resolve_homeworlds([data]):
+        return jsonify({"msg":"homeworld does not exist"}),400
+    values['homeworld_id'] = data.get('homeworld_id')
 
     if method == 'POST':
+        people_exist = db.session.execute(db.select(People).filter_by(name=name)).scalars().one_or_none()
         if people_exist==None:
-            new_people = People(
-                name = name,
-                birth_year = birth_year,
-                gender = gender,
-                height = height,
-                hair_color = hair_color,
-                homeworld = homeworld,
-                picture_url = picture_url
-                )
+            new_people = People(name=name, **values)
             try:
                 db.session.add(new_people)
                 db.session.commit()
             except Exception as error:
                 db.session.rollback()
-                print('Error:',error)
+                current_app.logger.error('Error: %s', error)
                 return jsonify({"message": "Error saving People to database"}), 500
 
             return jsonify({
@@ -87,47 +151,48 @@ def add_people():
         else:
             return jsonify({"msg":"People already exist"}),400
     elif method == 'PUT':
-        if people_exist !=None:
-            people_exist.name = name
-            people_exist.birth_year = birth_year
-            people_exist.gender = gender
-            people_exist.height = height
-            people_exist.hair_color = hair_color
-            people_exist.homeworld = homeworld
-            people_exist.picture_url = picture_url
-            try:
-                db.session.commit()
-                return jsonify({'msg':'update completed','people_id':people_exist.id})
-            except Exception as error:
-                db.session.rollback()
-                print('Error:',error)
-                return jsonify({"message": "Error updating People to database"}), 500
-        else:
+        # one UPDATE ... RETURNING, only of the version sent in If-Match if any
+        expected = if_match(People)
+        criteria = [People.name == name] if expected is None else [People.name == name, People.id == expected[0]]
+        try:
+            people, version_id = update_returning(People, criteria, values, expected[1] if expected is not None else None)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.error('Error: %s', error)
+            return jsonify({"message": "Error updating People to database"}), 500
+        if people == None:
+            # no row updated, one more query tells the client why
+            if expected != None and db.session.execute(db.select(People.id).filter_by(name=name)).scalar() != None:
+                return jsonify({'msg':'people was modified by another request, fetch it again'}),412
             return jsonify({'msg':'people does not exist'})
+        response = jsonify({'msg':'update completed','people_id':people['id'],'people':people})
+        response.set_etag(item_etag(People, people['id'], None, version_id))
+        return response
+
 
+@api.route('/people/batch', methods=['POST'])
+def add_people_batch():
+    items = batch_items()
+    unknown = resolve_homeworlds(items)
+    unknown_homeworld = lambda item: 'homeworld does not exist' \
+        if item.get('homeworld') in unknown or item.get('homeworld_id') in unknown else None
+    results = batch_upsert(People, 'name', items, unknown_homeworld)
+    return jsonify({'msg':'ok','results':results}), 200
 
-@app.route('/user', methods=['POST'])
+@api.route('/user', methods=['POST'])
 def add_user():
-    data = request.json
-    email = data.get('email')
-    user_name = data.get('user_name')
-    full_name = data.get('full_name')
-    password = data.get('password')
-    
-    user_exist = db.session.execute(db.select(User).filter_by(email=email)).one_or_none()
+    values = validated(User, request.get_json(silent=True))
+
+    user_exist = db.session.execute(db.select(User).filter_by(email=values['email'])).one_or_none()
     if user_exist==None:
-        new_user = User(
-            email = email,
-            user_name = user_name,
-            full_name = full_name,
-            password = password
-            )
+        new_user = User(**values)
         try:
             db.session.add(new_user)
             db.session.commit()
         except Exception as error:
             db.session.rollback()
-            print('Error:',error)
+            current_app.logger.error('Error: %s', error)
             return jsonify({"message": "Error saving user to database"}), 500
 
         return jsonify({
@@ -137,45 +202,33 @@ def add_user():
     else:
         return jsonify({"msg":"User already exist"}),400
 
-@app.route('/users',methods=['GET'])
+@api.route('/users',methods=['GET'])
+@conditional('user')
 def list_users():
-    users_list=[]
-    users = db.session.execute(db.select(User)).all()
-    for user in users:
-        users_list.append(user[0].serialize())
-    return jsonify({'msg':'ok','users':users_list})
+    if wants_stream():
+        return stream_rows(User, USER_FIELDS, [])
+    users_list, cursor = paginate(User, USER_FIELDS, [])
+    return jsonify({'msg':'ok','users':users_list,'next':next_page_url(cursor)})
 
-@app.route('/users/<int:id>',methods=['GET'])
+@api.route('/users/<int:id>',methods=['GET'])
+@conditional(model=User, item_arg='id')
 def single_user(id):
     user = db.session.execute(db.select(User).filter_by(id=id)).one_or_none();
     if user == None:
         return jsonify({"msg":"user not found"}),404
     else:
-        print("This is the user",user[0].serialize())
         return jsonify({"msg":"ok","user":user[0].serialize()})
 
-@app.route('/planet', methods=['POST','PUT'])
+@api.route('/planet', methods=['POST','PUT'])
 def add_planet():
-    data = request.json
     method = request.method
-    planet_name = data.get('planet_name')
-    population = data.get('population')
-    climate = data.get('climate')
-    diameter = data.get('diameter')
-    gravity = data.get('gravity')
-    picture_url = data.get('picture_url')
-
-    planet_exist = db.session.execute(db.select(Planets).filter_by(planet_name=planet_name)).scalars().one_or_none()
+    values = validated(Planets, request.get_json(silent=True), required=('planet_name',))
+    planet_name = values.pop('planet_name')
+
     if method == 'POST':
+        planet_exist = db.session.execute(db.select(Planets).filter_by(planet_name=planet_name)).scalars().one_or_none()
         if planet_exist==None:
-            new_planet = Planets(
-                planet_name = planet_name,
-                population = population,
-                climate = climate,
-                diameter = diameter,
-                gravity = gravity,
-                picture_url = picture_url
-                )
+            new_planet = Planets(planet_name=planet_name, **values)
             try:
                 db.session.add(new_planet)
                 db.session.commit()
@@ -190,33 +243,44 @@ def add_planet():
         else:
             return jsonify({"msg":"Planet already exist"}),400
     elif method == 'PUT':
-        if planet_exist != None:
-            planet_exist.planet_name = planet_name
-            planet_exist.population = population
-            planet_exist.climate = climate
-            planet_exist.diameter = diameter
-            planet_exist.gravity = gravity
-            planet_exist.picture_url = picture_url
-            
-            try:
-                db.session.commit()
-                return jsonify({'msg':'update completed','planet_id':planet_exist.id})
-            except Exception as error:
-                db.session.rollback()
-                print('Error:',error)
-                return jsonify({"message": "Error updating Planet to database"}), 500
-        else:
-                return jsonify({'msg':'planet does not exist'})
-        
-@app.route('/planets', methods=['GET'])
+        # one UPDATE ... RETURNING, only of the version sent in If-Match if any
+        expected = if_match(Planets)
+        criteria = [Planets.planet_name == planet_name]
+        if expected is not None:
+            criteria.append(Planets.id == expected[0])
+        try:
+            planet, version_id = update_returning(Planets, criteria, values, expected[1] if expected is not None else None)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.error('Error: %s', error)
+            return jsonify({"message": "Error updating Planet to database"}), 500
+        if planet == None:
+            # no row updated, one more query tells the client why
+            if expected != None and db.session.execute(db.select(Planets.id).filter_by(planet_name=planet_name)).scalar() != None:
+                return jsonify({'msg':'planet was modified by another request, fetch it again'}),412
+            return jsonify({'msg':'planet does not exist'})
+        response = jsonify({'msg':'update completed','planet_id':planet['id'],'planet':planet})
+        response.set_etag(item_etag(Planets, planet['id'], None, version_id))
+        return response
+
+@api.route('/planet/batch', methods=['POST'])
+def add_planet_batch():
+    results = batch_upsert(Planets, 'planet_name', batch_items())
+    return jsonify({'msg':'ok','results':results}), 200
+
+@api.route('/planets', methods=['GET'])
+@conditional('planets')
+@cache.cached('planets')
 def list_planets():
-    planets_list=[]
-    planets = db.session.execute(db.select(Planets)).all()
-    for planet in planets:
-        planets_list.append(planet[0].serialize())
-    return jsonify({'msg':'ok','users':planets_list})
+    if wants_stream():
+        return stream_rows(Planets, PLANET_FIELDS, ['climate'])
+    planets_list, cursor = paginate(Planets, PLANET_FIELDS, ['climate'])
+    return jsonify({'msg':'ok','users':planets_list,'next':next_page_url(cursor)})
 
-@app.route('/planets/<int:id>', methods=['GET','DELETE'])
+@api.route('/planets/<int:id>', methods=['GET','DELETE'])
+@conditional(model=Planets, item_arg='id')
+@cache.cached('planets', item_arg='id')
 def single_planet(id):
     method = request.method
     planet = db.session.execute(db.select(Planets).filter_by(id=id)).scalars().one_or_none();
@@ -230,20 +294,61 @@ def single_planet(id):
                 return jsonify({"msg":"planet deleted", "id":id})
             except Exception as error:
                 db.session.rollback()
-                print('error', error)
+                current_app.logger.error('Error: %s', error)
                 return jsonify({"message": "Error deleting Planet"}), 500
         else:
             return jsonify({"msg":"ok","planet":planet.serialize()})
 
-@app.route('/people', methods=['GET'])
+@api.route('/planets/<int:id>', methods=['PATCH'])
+def patch_planet(id):
+    # validated before any query, the UPDATE only sets the fields sent
+    values = validated(Planets, request.get_json(silent=True), partial=True)
+    expected = if_match(Planets)
+    if expected is not None and expected[0] != id:
+        return jsonify({'msg':'If-Match is for another planet'}),412
+    try:
+        planet, version_id = update_returning(Planets, [Planets.id == id], values, expected[1] if expected is not None else None)
+        if planet != None and 'planet_name' in values:
+            touch_residents(db.session, [id])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'msg':'planet_name already exists'}),409
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.error('Error: %s', error)
+        return jsonify({"message": "Error updating Planet to database"}), 500
+    if planet == None:
+        if expected != None and db.session.get(Planets, id) != None:
+            return jsonify({'msg':'planet was modified by another request, fetch it again'}),412
+        return jsonify({"msg":"planet not found"}),404
+    response = jsonify({'msg':'update completed','planet_id':id,'planet':planet})
+    response.set_etag(item_etag(Planets, id, None, version_id))
+    return response
+
+@api.route('/planets/<int:id>/residents', methods=['GET'])
+@conditional('people', 'planets')
+@cache.cached('people')
+def planet_residents(id):
+    if db.session.get(Planets, id) is None:
+        return jsonify({"msg":"planet not found"}),404
+    if wants_stream():
+        return stream_rows(People, PEOPLE_FIELDS, ['gender'], People.homeworld_id == id)
+    people_list, cursor = paginate(People, PEOPLE_FIELDS, ['gender'], People.homeworld_id == id)
+    return jsonify({'msg':'ok','people':people_list,'next':next_page_url(cursor)})
+
+@api.route('/people', methods=['GET'])
+@conditional('people')
+@cache.cached('people')
 def people():
-    people_list=[]
-    people = db.session.execute(db.select(People)).all()
-    for single_person in people:
-        people_list.append(single_person[0].serialize())
-    return jsonify({'msg':'ok','people':people_list})
+    if wants_stream():
+        return stream_rows(People, PEOPLE_FIELDS, ['homeworld', 'homeworld_id', 'gender'])
+    people_list, cursor = paginate(People, PEOPLE_FIELDS, ['homeworld', 'homeworld_id', 'gender'])
+    return jsonify({'msg':'ok','people':people_list,'next':next_page_url(cursor)})
     
-@app.route('/people/<int:people_id>',methods=['GET','DELETE'])
+@api.route('/people/<int:people_id>',methods=['GET','DELETE'])
+@conditional(model=People, item_arg='people_id')
+@cache.cached('people', item_arg='people_id')
 def single_person(people_id):
     method = request.method
     person = db.session.execute(db.select(People).filter_by(id=people_id)).scalars().one_or_none();
@@ -257,110 +362,176 @@ def single_person(people_id):
                 return jsonify({"msg":"person deleted", "id":people_id})
             except Exception as error:
                 db.session.rollback()
-                print('error', error)
+                current_app.logger.error('Error: %s', error)
                 return jsonify({"message": "Error deleting People"}), 500
         else:
             return jsonify({"msg":"ok","planet":person.serialize()})
 
-@app.route('/user/favorites',methods=['GET'])
+@api.route('/people/<int:people_id>', methods=['PATCH'])
+def patch_person(people_id):
+    # validated before any query, the UPDATE only sets the fields sent
+    values = validated(People, request.get_json(silent=True), partial=True)
+    expected = if_match(People)
+    if expected is not None and expected[0] != people_id:
+        return jsonify({'msg':'If-Match is for another person'}),412
+    try:
+        person, version_id = update_returning(People, [People.id == people_id], values, expected[1] if expected is not None else None)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'msg':'name already exists or homeworld_id is not a planet'}),409
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.error('Error: %s', error)
+        return jsonify({"message": "Error updating People to database"}), 500
+    if person == None:
+        if expected != None and db.session.get(People, people_id) != None:
+            return jsonify({'msg':'people was modified by another request, fetch it again'}),412
+        return jsonify({"msg":"person not found"}),404
+    response = jsonify({'msg':'update completed','people_id':people_id,'people':person})
+    response.set_etag(item_etag(People, people_id, None, version_id))
+    return response
+
+@api.route('/search', methods=['GET'])
+@conditional('people', 'planets')
+def search_catalog():
+    q = request.args.get('q', '')
+    limit = page_limit()
+    offset = request.args.get('offset', 0, type=int)
+    if not q.strip():
+        raise APIException('q is required')
+    if offset < 0:
+        raise APIException('offset must be positive')
+    results = search(q, limit + 1, offset)
+    next_offset = offset + limit if len(results) > limit else None
+    return jsonify({'msg':'ok','results':results[:limit],'next':next_page_url(next_offset, 'offset')})
+
+@api.route('/stats/favorites/top', methods=['GET'])
+@conditional('favorites', 'people', 'planets')
+def favorites_top():
+    kind = request.args.get('kind', 'people')
+    if kind not in FAVORITE_KINDS:
+        raise APIException('kind must be one of: %s' % ', '.join(FAVORITE_KINDS))
+    return jsonify({'msg':'ok','kind':kind,'top':top_favorites(kind, page_limit())})
+
+@api.route('/user/favorites',methods=['GET'])
+@conditional('user', 'favorites', 'people', 'planets')
 def user_favorites():
-    data = request.json
-    user_id = data.get('user_id')
+    data = request.get_json(silent=True) or {}
+    user_id = request.args.get('user_id', data.get('user_id'), type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise APIException('limit must be between 1 and %d' % MAX_PAGE_SIZE)
     try:
         user = db.session.execute(db.select(User).filter_by(id=user_id)).scalars().one_or_none();
+        if user == None:
+            return jsonify({"msg":"user not found"}),404
+        favorites = user.favorites(limit=limit,
+                                   planets_after=request.args.get('planets_after', type=int),
+                                   people_after=request.args.get('people_after', type=int))
     except:
         return jsonify({"msg":"Database processing error, try again"}),500
-    if user == None:
-        return jsonify({"msg":"user not found"}),404
+    return jsonify({"msg":"ok",
+                    "user_id":user_id,
+                    "user_name":user.user_name,
+                    "user_favorites":favorites}),200
+
+@api.route('/users/<int:id>/favorites', methods=['PUT','PATCH'])
+def update_user_favorites(id):
+    # PUT {"planets": [ids], "people": [ids]} replaces the favorites, a missing list means none
+    # PATCH {"add": {"planets": [ids]...}, "remove": {"people": [ids]...}} changes only those
+    data = request.get_json(silent=True)
+    if request.method == 'PUT':
+        add, remove = id_lists(data, FAVORITE_KINDS), {}
     else:
-        return jsonify({"msg":"ok",
-                        "user_id":user_id,
-                        "user_name":user.user_name,
-                        "user_favorites":user.favorites()}),200
+        if not isinstance(data, dict):
+            raise APIException('expected a JSON object')
+        add = id_lists(data.get('add', {}), FAVORITE_KINDS)
+        remove = id_lists(data.get('remove', {}), FAVORITE_KINDS, disjoint_from=add)
+    if db.session.execute(db.select(User.id).filter_by(id=id)).scalar() == None:
+        return jsonify({"msg":"user not found"}),404
+    try:
+        results = update_favorites(id, add, remove, replace=request.method == 'PUT')
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.error('Error: %s', error)
+        return jsonify({"message": "Error updating favorites"}), 500
+    return jsonify({'msg':'ok','user_id':id,'results':results}), 200
 
-@app.route('/favorite/planet/<int:planet_id>',methods=['POST','DELETE'])
+@api.route('/favorite/planet/<int:planet_id>',methods=['POST','DELETE'])
 def user_fav_planet(planet_id):
     data = request.json
     method = request.method
     current_user_id = data.get('current_user_id')
-    is_valid_planet = db.session.execute(db.select(Planets).filter_by(id=planet_id)).one_or_none()
-    is_valid_user = db.session.execute(db.select(User).filter_by(id=current_user_id)).one_or_none()
-    already_favorite = db.session.execute(db.select(FavoritePlanets).filter(and_(FavoritePlanets.user_fav_id == current_user_id,
-             FavoritePlanets.planet_fav_id == planet_id))).scalars().one_or_none()
     if method=='DELETE':
-        if already_favorite == None:
+        try:
+            deleted_id = remove_favorite(FavoritePlanets, current_user_id, planet_id)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            return jsonify({"message": "Error deleting Favorite Planet record"}), 500
+        if deleted_id == None:
             return jsonify({'msg':'planet is not favorite for this user'})
-        else:
-            try:
-                db.session.delete(already_favorite)
-                db.session.commit()
-            except Exception as error:
-                db.session.rollback()
-                return jsonify({"message": "Error deleting Favorite Planet record"}), 500
-            return jsonify ({'msg':'favorite planet record deleted',
-                             'user_id':current_user_id,
-                             'people':planet_id})
-    if is_valid_planet == None or is_valid_user == None :
-        return jsonify ({'msg':'non valid user or people id'})
-    elif already_favorite != None :
-        return jsonify ({'msg':'planet already favorite for this user'})
-    else:
-        new_planet_favorite=FavoritePlanets(
-            planet_fav_id = planet_id,
-            user_fav_id = current_user_id)
-
+        return jsonify ({'msg':'favorite planet record deleted',
+                         'user_id':current_user_id,
+                         'people':planet_id})
     try:
-            db.session.add(new_planet_favorite)
-            db.session.commit()
+        new_id = add_favorite(FavoritePlanets, Planets, current_user_id, planet_id)
+        db.session.commit()
     except Exception as error:
-            db.session.rollback()
-            return jsonify({"message": "Error saving Favorite People to database"}), 500         
+        db.session.rollback()
+        return jsonify({"message": "Error saving Favorite Planet to database"}), 500
+    if new_id == None:
+        # nothing inserted, one more query tells the client why
+        already_favorite = db.session.execute(db.select(FavoritePlanets.id).filter(and_(FavoritePlanets.user_fav_id == current_user_id,
+                 FavoritePlanets.planet_fav_id == planet_id))).scalar()
+        if already_favorite != None:
+            return jsonify ({'msg':'planet already favorite for this user'})
+        return jsonify ({'msg':'non valid user or planet id'})
 
-    print("response:",new_planet_favorite.serialize())
     return {"msg":"ok",
-            "favorite_people":new_planet_favorite.serialize()},200
+            "favorite_people":{'id':new_id,
+                               'user_fav_id':current_user_id,
+                               'planet_fav_id':planet_id}},200
 
-@app.route('/favorite/people/<int:people_id>',methods=['POST','DELETE'])
+@api.route('/favorite/people/<int:people_id>',methods=['POST','DELETE'])
 def user_fav_people(people_id):
     data = request.json
     method = request.method
     current_user_id = data.get('current_user_id')
-    is_valid_people = db.session.execute(db.select(People).filter_by(id=people_id)).one_or_none()
-    is_valid_user = db.session.execute(db.select(User).filter_by(id=current_user_id)).one_or_none()
-    already_favorite = db.session.execute(db.select(FavoritePeople).filter(and_(FavoritePeople.user_fav_id == current_user_id,
-             FavoritePeople.people_fav_id == people_id))).scalars().one_or_none()
     if method=='DELETE':
-        if already_favorite == None:
+        try:
+            deleted_id = remove_favorite(FavoritePeople, current_user_id, people_id)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            return jsonify({"message": "Error deleting Favorite People record"}), 500
+        if deleted_id == None:
             return jsonify({'msg':'people is not favorite for this user'})
-        else:
-            try:
-                db.session.delete(already_favorite)
-                db.session.commit()
-            except Exception as error:
-                db.session.rollback()
-                return jsonify({"message": "Error deleting Favorite People record"}), 500
-            return jsonify ({'msg':'favorite people record deleted',
-                             'user_id':current_user_id,
-                             'people':people_id})
-    if is_valid_people == None or is_valid_user == None :
-        return jsonify ({'msg':'non valid user or people id'})
-    elif already_favorite != None :
-        return jsonify ({'msg':'people already favorite for this user'})
-    else:
-        new_people_favorite=FavoritePeople(
-            people_fav_id = people_id,
-            user_fav_id = current_user_id)
-
+        return jsonify ({'msg':'favorite people record deleted',
+                         'user_id':current_user_id,
+                         'people':people_id})
     try:
-            db.session.add(new_people_favorite)
-            db.session.commit()
+        new_id = add_favorite(FavoritePeople, People, current_user_id, people_id)
+        db.session.commit()
     except Exception as error:
-            db.session.rollback()
-            return jsonify({"message": "Error saving Favorite People to database"}), 500         
+        db.session.rollback()
+        return jsonify({"message": "Error saving Favorite People to database"}), 500
+    if new_id == None:
+        # nothing inserted, one more query tells the client why
+        already_favorite = db.session.execute(db.select(FavoritePeople.id).filter(and_(FavoritePeople.user_fav_id == current_user_id,
+                 FavoritePeople.people_fav_id == people_id))).scalar()
+        if already_favorite != None:
+            return jsonify ({'msg':'people already favorite for this user'})
+        return jsonify ({'msg':'non valid user or people id'})
 
-    print("response:",new_people_favorite.serialize())
     return {"msg":"ok",
-            "favorite_people":new_people_favorite.serialize()},200
+            "favorite_people":{'id':new_id,
+                               'user_fav_id':current_user_id,
+                               'people_fav_id':people_id}},200
+
+app = create_app()
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
@@ -0,0 +1,198 @@
+# ASGI entry point, an alternative to wsgi.py:
+#   $ uvicorn asgi:application --app-dir src
+#   $ gunicorn asgi:application -k uvicorn.workers.UvicornWorker --chdir ./src/
+# It needs the async drivers: pipenv install uvicorn asgiref asyncpg aiosqlite
+
+"""
+The read endpoints that spend most of their time waiting on the database,
+GET /people, /planets, /users and /user/favorites, are served here on an async
+SQLAlchemy engine (asyncpg for PostgreSQL, aiosqlite for SQLite) with the same
+models and query builders as app.py, so one worker keeps many of them in
+flight. Every other request, and reads using features only the Flask views
+implement (NDJSON streaming), are handed to the Flask app, which asgiref runs
+in a thread pool. Native responses are answered inside a Flask request context
+and go through the app's request hooks like the Flask ones: CORS headers,
+Server-Timing and metrics (with the queries of the async engine), compression
+(see compression.py). They carry the ETag and Last-Modified of the Flask view,
+answer 304 to a matching conditional request, and share its response cache
+entries (see conditional.py and cache.py).
+"""
+import io
+import sys
+from urllib.parse import parse_qsl, urlencode
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from flask import g
+from werkzeug.datastructures import MultiDict
+from app import app, USER_FIELDS, PEOPLE_FIELDS, PLANET_FIELDS
+from cache import cache
+from conditional import list_validators, not_modified, set_validators, versions_statement
+from metrics import request_metrics
+from models import db, User, People, Planets, favorites_statements, favorites_result
+from pool import engine_options, env_flag
+from utils import APIException, NDJSON_MIMETYPE, list_query, page_limit, page_result
+
+# path -> (model, fields, filters, response key) mirroring the Flask list views
+LIST_ROUTES = {
+    '/people': (People, PEOPLE_FIELDS, ['homeworld', 'homeworld_id', 'gender'], 'people'),
+    '/planets': (Planets, PLANET_FIELDS, ['climate'], 'users'),
+    '/users': (User, USER_FIELDS, [], 'users'),
+}
+FAVORITES_ROUTE = '/user/favorites'
+# path -> (TableVersion names of its @conditional, response cache resource or None) of the Flask view
+ROUTE_VALIDATORS = {
+    '/people': (('people',), 'people'),
+    '/planets': (('planets',), 'planets'),
+    '/users': (('user',), None),
+    FAVORITES_ROUTE: (('user', 'favorites', 'people', 'planets'), None),
+}
+
+
+def async_database_uri(uri):
+    if uri.startswith('postgresql://'):
+        return 'postgresql+asyncpg://' + uri[len('postgresql://'):]
+    if uri.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + uri[len('sqlite://'):]
+    raise ValueError('no async driver configured for %s' % uri.split(':')[0])
+
+def async_engine_options(uri):
+    options = engine_options(uri)
+    if uri.startswith('postgresql') and env_flag('DB_PGBOUNCER', '0'):
+        # asyncpg prepares statements, which PgBouncer transaction pooling cannot route
+        options['connect_args'] = {'statement_cache_size': 0}
+    return options
+
+def wsgi_environ(scope):
+    """ The WSGI environ of a bodyless ASGI http request """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        uri = flask_app.config['SQLALCHEMY_DATABASE_URI']
+        self.engine = create_async_engine(async_database_uri(uri), **async_engine_options(uri))
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        request_metrics.listen(self.engine.sync_engine)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            path = scope['path'].rstrip('/') or '/'
+            args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1')))
+            headers = dict(scope['headers'])
+            if self.is_native(path, args, headers):
+                return await self.native(scope, send, path, args)
+        return await self.wsgi(scope, receive, send)
+
+    async def native(self, scope, send, path, args):
+        flask_app = self.flask_app
+        # the environ the Flask app would get, so its before/after request hooks apply
+        environ = wsgi_environ(scope)
+        with flask_app.request_context(environ):
+            response = flask_app.preprocess_request()
+            if response is None:
+                response = await self.respond(path, args)
+            response = flask_app.process_response(flask_app.make_response(response))
+            payload = response.get_data()
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def respond(self, path, args):
+        """ The response of a native route, with the validators and response cache of its Flask view """
+        flask_app = self.flask_app
+        names, resource = ROUTE_VALIDATORS[path]
+        async with self.session() as session:
+            rows = (await session.execute(versions_statement(names))).all()
+            etag, last_modified = list_validators(names, rows)
+            if not_modified(etag, last_modified):
+                return set_validators(flask_app.response_class(status=304), etag, last_modified)
+            g.validator = etag
+            key = cache.page_key(resource, etag) if resource is not None and cache.backend is not None else None
+            body = cache.get(key) if key is not None else None
+            if body is not None:
+                response = flask_app.response_class(body, mimetype='application/json')
+            else:
+                try:
+                    status, body = await self.handle(session, path, args)
+                except APIException as error:
+                    status, body = error.status_code, error.to_dict()
+                response = flask_app.json.response(body)
+                response.status_code = status
+                if key is not None:
+                    cache.store(key, response)
+        if response.status_code != 200:
+            return response
+        return set_validators(response, etag, last_modified)
+
+    def is_native(self, path, args, headers):
+        if path not in ROUTE_VALIDATORS:
+            return False
+        if path == FAVORITES_ROUTE and args.get('user_id') is None:
+            return False  # user_id sent in a GET body, only the Flask view reads it
+        return args.get('stream') != '1' and NDJSON_MIMETYPE.encode() not in headers.get(b'accept', b'')
+
+    async def handle(self, session, path, args):
+        if path == FAVORITES_ROUTE:
+            return await self.favorites(session, args)
+        model, fields, filters, key = LIST_ROUTES[path]
+        limit = page_limit(args)
+        stmt = list_query(model, fields, filters, args=args)
+        rows, cursor = page_result(await session.execute(stmt.limit(limit + 1)), limit)
+        next_url = None
+        if cursor is not None:
+            next_args = args.to_dict()
+            next_args['after'] = cursor
+            next_url = path + '?' + urlencode(next_args)
+        return 200, {'msg': 'ok', key: rows, 'next': next_url}
+
+    async def favorites(self, session, args):
+        user_id = args.get('user_id', type=int)
+        limit = page_limit(args)
+        user_name = (await session.execute(db.select(User.user_name).where(User.id == user_id))).scalar()
+        if user_name is None:
+            return 404, {'msg': 'user not found'}
+        planets, people = favorites_statements(user_id, limit,
+                                               args.get('planets_after', type=int),
+                                               args.get('people_after', type=int))
+        favorites = favorites_result(await session.execute(planets), await session.execute(people), limit)
+        return 200, {'msg': 'ok', 'user_id': user_id, 'user_name': user_name, 'user_favorites': favorites}
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncAPI(app)
@@ -0,0 +1,179 @@
+"""
+Read-through cache for the serialized JSON of the catalog GET endpoints.
+
+Backends are picked with the CACHE_BACKEND environment variable:
+- memory (default): in-process LRU bounded by CACHE_MAX_ENTRIES and CACHE_TTL
+- redis: any server speaking the Redis protocol at CACHE_URL (Redis, Valkey, KeyDB...)
+- none: caching disabled
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, make_response, current_app, has_app_context
+from metrics import CACHE_HITS, CACHE_MISSES
+from utils import wants_stream
+
+
+class LRUCache:
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    def __init__(self, url, ttl=60):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+
+class CacheState:
+    """ The backend and counters of the response cache of one app """
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+
+class ResponseCache:
+    """
+    Entries are keyed per resource: single items as
+    ``<resource>:item:<version>:<id>`` and list pages as
+    ``<resource>:page:<version>:<path and query>``. The version is the
+    validator the @conditional decorator computed from the database for
+    the request (table_version counters, version_id or updated_at), so any
+    committed write, from any worker, the admin or a script, makes the old
+    entries unreachable; they are left to expire. Nothing is deleted on
+    writes, and responses without a validator (views without @conditional)
+    are not cached. Compressed copies of a body are cached next to it as
+    ``<key>|<encoding>``.
+
+    The backend of each app lives in ``app.extensions['response_cache']``,
+    so apps built by several create_app() calls each keep their own.
+    """
+    def init_app(self, app):
+        backend = os.getenv('CACHE_BACKEND', 'memory')
+        ttl = int(os.getenv('CACHE_TTL', 60))
+        if backend == 'memory':
+            backend = LRUCache(int(os.getenv('CACHE_MAX_ENTRIES', 1024)), ttl)
+        elif backend == 'redis':
+            backend = RedisCache(os.getenv('CACHE_URL', 'redis://localhost:6379/0'), ttl)
+        elif backend == 'none':
+            backend = None
+        else:
+            raise ValueError('unknown CACHE_BACKEND %r' % backend)
+        app.extensions['response_cache'] = CacheState(backend)
+
+    @property
+    def state(self):
+        return current_app.extensions['response_cache']
+
+    @property
+    def backend(self):
+        """ The backend of the current app, None when caching is disabled or outside of an app """
+        if not has_app_context() or 'response_cache' not in current_app.extensions:
+            return None
+        return self.state.backend
+
+    def item_key(self, resource, validator, item_id):
+        return '%s:item:%s:%s' % (resource, validator, item_id)
+
+    def page_key(self, resource, validator):
+        return '%s:page:%s:%s' % (resource, validator, request.full_path)
+
+    def get(self, key):
+        """ The cached body of key, or None; a hit is served under g.cache_key """
+        body = self.backend.get(key)
+        if body is not None:
+            self.state.hits += 1
+            CACHE_HITS.inc()
+            g.cache_key = key
+        else:
+            self.state.misses += 1
+            CACHE_MISSES.inc()
+        return body
+
+    def store(self, key, response):
+        """ Cache the body of a successful JSON response """
+        if response.status_code == 200 and not response.is_streamed and response.mimetype == 'application/json':
+            self.backend.set(key, response.get_data())
+            g.cache_key = key
+
+    def encoded(self, key, encoding, body, encode):
+        """ The cached body of key in a content encoding, encoded on the first request only """
+        variant = '%s|%s' % (key, encoding)
+        data = self.backend.get(variant)
+        if data is None:
+            data = encode(body, encoding)
+            self.backend.set(variant, data)
+        return data
+
+    def stats(self):
+        state = self.state
+        return {'backend': type(state.backend).__name__ if state.backend else None,
+                'hits': state.hits,
+                'misses': state.misses,
+                'entries': len(state.backend) if state.backend else 0}
+
+    def cached(self, resource, item_arg=None):
+        """
+        Cache the body of successful GET JSON responses of a view, under
+        the validator @conditional set for the request. Views that also
+        answer other methods are only cached for GET.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                backend, validator = self.backend, g.get('validator')
+                if backend is None or validator is None or request.method != 'GET' or wants_stream():
+                    return view(*args, **kwargs)
+                if item_arg is not None:
+                    key = self.item_key(resource, validator, kwargs[item_arg])
+                else:
+                    key = self.page_key(resource, validator)
+                body = self.get(key)
+                if body is not None:
+                    return current_app.response_class(body, mimetype='application/json')
+                response = make_response(view(*args, **kwargs))
+                self.store(key, response)
+                return response
+            return wrapper
+        return decorator
+
+
+cache = ResponseCache()
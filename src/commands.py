@@ -0,0 +1,173 @@
+"""
+Flask CLI commands, run them with `$ flask catalog --help`
+"""
+import csv
+import os
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Boolean, Integer
+from sqlalchemy.exc import IntegrityError
+from models import db, dialect_insert, bump_versions, utcnow, resolve_homeworlds, rebuild_favorite_counts, VERSIONED_TABLES, FAVORITE_KINDS, User, People, Planets, FavoritePeople, FavoritePlanets
+
+catalog_cli = AppGroup('catalog', help='Load and maintain the people/planets catalog.')
+
+# (csv file, model, natural key used to upsert) in foreign key order. The
+# rows are matched on their natural key, never on the id of the CSV file:
+# ids are given by the database, the favorites are remapped to them and
+# matched on their (user, item) pair.
+CATALOG_FILES = [
+    ('user.csv', User, 'email'),
+    ('planets.csv', Planets, 'planet_name'),
+    ('people.csv', People, 'name'),
+    ('favorite_planets.csv', FavoritePlanets, None),
+    ('favorite_people.csv', FavoritePeople, None),
+]
+
+# homeworld values of the catalog files that mean no homeworld, like the
+# migration that turned people.homeworld into homeworld_id
+HOMEWORLD_PLACEHOLDERS = ('unknown', 'n/a')
+
+def _converter(column):
+    if isinstance(column.type, Boolean):
+        return lambda value: value.lower() in ('t', 'true', '1', 'yes')
+    if isinstance(column.type, Integer):
+        return lambda value: int(value) if value != '' else None
+    if column.nullable:
+        return lambda value: value if value != '' else None
+    return lambda value: value
+
+def read_chunks(path, table, batch_size):
+    """ Yield the rows of a CSV file as lists of column dicts, batch_size at a time """
+    with open(path, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        converters = {name: _converter(table.c[name]) for name in reader.fieldnames if name in table.c}
+        if 'homeworld' in reader.fieldnames and 'homeworld_id' in table.c:
+            # planet names, turned into homeworld_id by import_file
+            converters['homeworld'] = lambda value: value if value and value.lower() not in HOMEWORLD_PLACEHOLDERS \
+                else None
+        chunk = []
+        for line in reader:
+            chunk.append({name: convert(line[name]) for name, convert in converters.items()})
+            if len(chunk) >= batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def upsert_statement(table, key, columns):
+    """ INSERT ... ON CONFLICT (key) DO UPDATE for PostgreSQL and SQLite """
+    try:
+        stmt = dialect_insert(table)
+    except NotImplementedError as error:
+        raise click.ClickException(str(error))
+    updates = {name: stmt.excluded[name] for name in columns if name not in ('id', key)}
+    if updates and 'updated_at' in table.c:
+        updates['updated_at'] = utcnow()
+    if updates and 'version_id' in table.c:
+        updates['version_id'] = table.c.version_id + 1
+    if not updates:
+        return stmt.on_conflict_do_nothing(index_elements=[key])
+    return stmt.on_conflict_do_update(index_elements=[key], set_=updates)
+
+def favorite_statement(model):
+    """ INSERT ... ON CONFLICT (user, item) DO NOTHING of favorites already there under any id """
+    try:
+        stmt = dialect_insert(model.__table__)
+    except NotImplementedError as error:
+        raise click.ClickException(str(error))
+    return stmt.on_conflict_do_nothing(index_elements=['user_fav_id', model.item_column])
+
+def remap_favorites(chunk, model, ids):
+    """
+    Point the user and item ids of favorite rows at the ids the database
+    gave to those CSV rows. Returns the rows of users or items that are not
+    in the CSV files, which are skipped.
+    """
+    item_ids = ids.get(FAVORITE_KINDS[model.kind][1], {})
+    user_ids = ids.get(User, {})
+    rows, skipped = [], []
+    for row in chunk:
+        user_id, item_id = user_ids.get(row['user_fav_id']), item_ids.get(row[model.item_column])
+        if user_id is None or item_id is None:
+            skipped.append(row)
+            continue
+        row['user_fav_id'], row[model.item_column] = user_id, item_id
+        rows.append(row)
+    return rows, skipped
+
+def create_planets(names):
+    """ Planets for homeworld names matching none, as the homeworld_id migration does """
+    db.session.execute(dialect_insert(Planets.__table__).on_conflict_do_nothing(index_elements=['planet_name']),
+                       [{'planet_name': name} for name in sorted(names)])
+    bump_versions(db.session.connection(), ['planets'])
+
+def import_file(path, model, key, batch_size, ids):
+    """ Upsert one CSV file, recording the database id of each CSV id in ``ids`` """
+    table = model.__table__
+    total = 0
+    started = time.perf_counter()
+    for chunk in read_chunks(path, table, batch_size):
+        if hasattr(model, 'item_column'):
+            chunk, skipped = remap_favorites(chunk, model, ids)
+            if skipped:
+                click.echo('  %d favorites of users or items not in the CSV files skipped' % len(skipped))
+            if not chunk:
+                continue
+            for row in chunk:
+                row.pop('id', None)
+        if 'homeworld' in chunk[0]:
+            unknown = {name for name in resolve_homeworlds(chunk) if isinstance(name, str)}
+            if unknown:
+                click.echo('  planets created for the homeworlds naming no planet: %s' % ', '.join(sorted(unknown)))
+                create_planets(unknown)
+                resolve_homeworlds(chunk)
+            for row in chunk:
+                row.pop('homeworld')
+                row.setdefault('homeworld_id', None)
+        csv_ids = {row[key]: row.pop('id') for row in chunk if 'id' in row} if key is not None else {}
+        stmt = favorite_statement(model) if key is None else upsert_statement(table, key, chunk[0].keys())
+        # executemany: one round trip per batch instead of one per row
+        db.session.execute(stmt, chunk)
+        if csv_ids:
+            stmt = db.select(table.c[key], table.c.id).where(table.c[key].in_(list(csv_ids)))
+            ids.setdefault(model, {}).update((csv_ids[name], new_id) for name, new_id in db.session.execute(stmt))
+        bump_versions(db.session.connection(), [VERSIONED_TABLES[table.name]])
+        db.session.commit()
+        total += len(chunk)
+        elapsed = time.perf_counter() - started
+        click.echo('  %s: %d rows (%.0f rows/s)' % (table.name, total, total / elapsed if elapsed else total))
+    return total
+
+@catalog_cli.command('import')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows sent per INSERT batch.')
+def import_catalog(directory, batch_size):
+    """ Upsert the CSV files found in DIRECTORY (e.g. docs/) """
+    started = time.perf_counter()
+    grand_total = 0
+    ids = {}
+    for file_name, model, key in CATALOG_FILES:
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            click.echo('skipping %s (not found)' % file_name)
+            continue
+        click.echo('importing %s' % file_name)
+        try:
+            grand_total += import_file(path, model, key, batch_size, ids)
+        except IntegrityError as error:
+            db.session.rollback()
+            raise click.ClickException('%s: %s (the batches before it are imported)' % (file_name, error.orig))
+    # favorites are upserted in bulk, count them once at the end
+    rebuild_favorite_counts()
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    click.echo('imported %d rows in %.2fs' % (grand_total, elapsed))
+
+@catalog_cli.command('count-favorites')
+def recount_favorites():
+    """ Rebuild the favorite counters behind /stats/favorites/top from the favorite tables """
+    counted = rebuild_favorite_counts()
+    db.session.commit()
+    for kind, rows in counted.items():
+        click.echo('%s: %d favorite items' % (kind, rows))
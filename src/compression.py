@@ -0,0 +1,99 @@
+"""
+Negotiated compression of the JSON, NDJSON and text responses.
+
+The encoding is picked from Accept-Encoding among zstd (zstandard), br
+(brotli) and gzip, whichever are installed (all are in the Pipfile),
+preferring them in that order when the client weighs them equally. Bodies
+under COMPRESS_MIN_SIZE bytes (default 1024) are sent as they are. The
+levels are set with COMPRESS_ZSTD_LEVEL (3), COMPRESS_BROTLI_LEVEL (5) and
+COMPRESS_GZIP_LEVEL (6).
+
+Responses served by the response cache are compressed once per encoding and
+the compressed bytes are cached next to the body. Compressed responses get
+a weak ETag, which conditional requests compare weakly.
+"""
+import gzip
+import os
+from flask import g, request, current_app, has_app_context
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain'}
+
+
+class Encoders:
+    """ The compression settings of one app """
+    def __init__(self, min_size=1024, encoders=None, cache=None):
+        self.min_size = min_size
+        self.encoders = encoders or {'gzip': lambda data: gzip.compress(data, 6, mtime=0)}
+        self.cache = cache
+
+
+class Compressor:
+    """ Settings are kept per app in ``app.extensions['compressor']`` """
+    def __init__(self):
+        self.defaults = Encoders()
+
+    def init_app(self, app, cache=None):
+        encoders = {}
+        if zstandard is not None:
+            encoders['zstd'] = zstandard.ZstdCompressor(level=int(os.getenv('COMPRESS_ZSTD_LEVEL', 3))).compress
+        if brotli is not None:
+            quality = int(os.getenv('COMPRESS_BROTLI_LEVEL', 5))
+            encoders['br'] = lambda data: brotli.compress(data, quality=quality)
+        gzip_level = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+        encoders['gzip'] = lambda data: gzip.compress(data, gzip_level, mtime=0)
+        app.extensions['compressor'] = Encoders(int(os.getenv('COMPRESS_MIN_SIZE', 1024)), encoders, cache)
+        app.after_request(self._after_request)
+
+    @property
+    def settings(self):
+        """ The settings of the current app, the gzip only defaults outside of one """
+        if has_app_context():
+            return current_app.extensions.get('compressor', self.defaults)
+        return self.defaults
+
+    def negotiate(self, accept_encoding):
+        """ The best encoding for an Accept-Encoding header value, or None to send identity """
+        if not accept_encoding:
+            return None
+        return parse_accept_header(accept_encoding).best_match(list(self.settings.encoders))
+
+    def compress(self, data, encoding):
+        return self.settings.encoders[encoding](data)
+
+    def _after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304) or response.direct_passthrough
+                or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        settings = self.settings
+        data = response.get_data()
+        if len(data) < settings.min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        cache_key = g.get('cache_key')
+        if cache_key is not None and settings.cache is not None and settings.cache.backend is not None:
+            body = settings.cache.encoded(cache_key, encoding, data, self.compress)
+        else:
+            body = self.compress(data, encoding)
+        response.set_data(body)
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compressor = Compressor()
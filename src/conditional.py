@@ -0,0 +1,117 @@
+"""
+Conditional GET support: ETag / If-None-Match and Last-Modified / If-Modified-Since.
+
+Validators are computed before the view runs and without loading any rows:
+- list endpoints use the write counters in the table_version table
+- single item endpoints use the updated_at column of the requested row, and
+  its version_id for the models that have one
+so a matching request is answered with 304 Not Modified without touching
+the data or serializing anything. Otherwise the validator keys the
+response cache entry of the view, so a cached body is never served under
+a newer ETag.
+
+Writes to versioned items honour If-Match: if_match() reads the id and
+version_id back from the ETag and the update only applies to that version,
+412 Precondition Failed otherwise.
+"""
+import re
+import zlib
+from datetime import timezone
+from functools import wraps
+from flask import g, request, make_response, current_app
+from compression import compressor
+from models import db, TableVersion
+from utils import APIException, wants_stream
+
+
+def versions_statement(names):
+    return db.select(TableVersion.name, TableVersion.version, TableVersion.updated_at) \
+        .where(TableVersion.name.in_(names))
+
+def list_validators(names, rows=None):
+    """ ETag and Last-Modified of a list request from the TableVersion ``rows`` of names, read if not given """
+    if rows is None:
+        rows = db.session.execute(versions_statement(names)).all()
+    versions = {name: (version, updated_at) for name, version, updated_at in rows}
+    # a GET body (e.g. /user/favorites) changes the representation like the query string does
+    request_key = zlib.crc32(request.full_path.encode() + request.get_data())
+    etag = '-'.join('%s.%d' % (name, versions.get(name, (0, None))[0]) for name in names)
+    etag = '%s-%08x' % (etag, request_key)
+    modified = [updated_at for version, updated_at in versions.values()]
+    return etag, max(modified) if len(modified) == len(names) else None
+
+def item_etag(model, item_id, updated_at, version_id=None):
+    if version_id is not None:
+        return '%s-%s-v%d' % (model.__tablename__, item_id, version_id)
+    return '%s-%s-%s' % (model.__tablename__, item_id, updated_at.strftime('%Y%m%d%H%M%S%f'))
+
+def item_validators(model, item_id):
+    versioned = hasattr(model, 'version_id')
+    columns = [model.updated_at, model.version_id] if versioned else [model.updated_at]
+    row = db.session.execute(db.select(*columns).where(model.id == item_id)).one_or_none()
+    if row is None:
+        return None, None
+    return item_etag(model, item_id, *row), row[0]
+
+def if_match(model):
+    """
+    The (id, version_id) of the item of a versioned model the client sent
+    in If-Match, or None without If-Match or with If-Match: *. A tag that
+    is not one of our item ETags can never match, it fails with 412.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    # compressed responses carry the weak form of the same tag
+    for tag in request.if_match.as_set(include_weak=True):
+        match = re.fullmatch(r'%s-(\d+)-v(\d+)' % re.escape(model.__tablename__), tag)
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    raise APIException('If-Match does not match the current version', status_code=412)
+
+def not_modified(etag, last_modified):
+    if request.if_none_match:
+        # weak comparison, compressed responses carry a weak ETag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    return False
+
+def conditional(*names, model=None, item_arg=None):
+    """
+    Add ETag and Last-Modified to successful GET and HEAD responses of a
+    view and answer 304 when the client copy is current. List views pass the
+    TableVersion names they depend on, item views the model and the name
+    of the id argument.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            if model is not None:
+                etag, last_modified = item_validators(model, kwargs[item_arg])
+            else:
+                etag, last_modified = list_validators(names)
+            if etag is None:
+                return view(*args, **kwargs)
+            if wants_stream():
+                etag += '-ndjson'
+            if not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                # the response cache keys the body by it, see cache.py
+                g.validator = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return set_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+def set_validators(response, etag, last_modified):
+    # weak when the body is sent compressed, as compression.py marks it, so a 304 carries the tag of its 200
+    response.set_etag(etag, weak=compressor.negotiate(request.headers.get('Accept-Encoding')) is not None)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,36 @@
+"""
+Flask JSON provider backed by orjson (in the Pipfile), with the stdlib based
+default provider as fallback where it is not installed. jsonify(), request.json
+and app.json.dumps() all go through it.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self._options()),
+                                        mimetype=self.mimetype)
+
+
+def init_json(app):
+    provider_class = OrjsonProvider if orjson is not None else DefaultJSONProvider
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
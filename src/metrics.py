@@ -0,0 +1,108 @@
+"""
+Per request performance instrumentation.
+
+For every request it records the latency, the number of SQL statements and
+the time spent in the database, adds them as a Server-Timing header, and
+aggregates them per endpoint with prometheus_client. GET /metrics serves
+them in the Prometheus text format.
+Requests running more than QUERY_BUDGET statements (default 20) are logged.
+
+Every gunicorn worker is a process with its own counters. When
+PROMETHEUS_MULTIPROC_DIR names a directory (gunicorn.conf.py sets one) the
+workers keep their values in files there and /metrics, whichever worker a
+scrape reaches, reports the sum of all of them, including the workers
+already recycled. Without it /metrics reports the answering process only,
+which is only right for a single process (flask run, one uvicorn worker).
+"""
+import os
+import time
+from flask import g, has_request_context, request, current_app
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+LABELS = ('endpoint', 'method')
+
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency', LABELS, buckets=LATENCY_BUCKETS)
+QUERIES = Histogram('db_queries_per_request', 'SQL statements run per request', LABELS, buckets=QUERY_BUCKETS)
+DB_SECONDS = Counter('db_seconds', 'Time spent running SQL statements', LABELS)
+RESPONSES = Counter('http_responses', 'Responses sent', LABELS + ('status',))
+OVER_BUDGET = Counter('http_requests_over_query_budget', 'Requests running more than QUERY_BUDGET statements', LABELS)
+CACHE_HITS = Counter('cache_hits', 'Responses served from the response cache')
+CACHE_MISSES = Counter('cache_misses', 'Cacheable responses computed by the view')
+POOL_CHECKOUTS = Counter('db_pool_checkouts', 'Connections checked out of the pool')
+POOL_CONNECTS = Counter('db_pool_connects', 'Database connections opened')
+POOL_INVALIDATIONS = Counter('db_pool_invalidations', 'Pooled connections invalidated')
+
+
+class RequestMetrics:
+    """ The query budget of each app is kept in ``app.extensions['request_metrics']`` """
+    def init_app(self, app, db):
+        app.extensions['request_metrics'] = int(os.getenv('QUERY_BUDGET', 20))
+        with app.app_context():
+            self.listen(db.engine)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def listen(self, engine):
+        """ Count the statements of ``engine`` in the metrics of the current request """
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_seconds = 0.0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._statement_done(conn)
+
+    def _handle_error(self, context):
+        # a failed statement gets no after_cursor_execute, its start must not stay on the pooled connection
+        if context.connection is not None and context.execution_context is not None:
+            self._statement_done(context.connection)
+
+    def _statement_done(self, conn):
+        started = conn.info.get('metrics_started')
+        if not started:
+            return
+        started_at = started.pop()
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+            g.metrics_db_seconds += time.perf_counter() - started_at
+
+    def _after_request(self, response):
+        if 'metrics_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = request.endpoint or 'unmatched'
+        LATENCY.labels(endpoint, request.method).observe(elapsed)
+        QUERIES.labels(endpoint, request.method).observe(g.metrics_queries)
+        DB_SECONDS.labels(endpoint, request.method).inc(g.metrics_db_seconds)
+        RESPONSES.labels(endpoint, request.method, str(response.status_code)).inc()
+        query_budget = current_app.extensions['request_metrics']
+        if g.metrics_queries > query_budget:
+            OVER_BUDGET.labels(endpoint, request.method).inc()
+            current_app.logger.warning('%s %s ran %d SQL statements (budget %d)',
+                                       request.method, request.full_path, g.metrics_queries, query_budget)
+        response.headers['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", app;dur=%.2f' % (
+            g.metrics_db_seconds * 1000, g.metrics_queries, elapsed * 1000)
+        return response
+
+    def prometheus(self):
+        """ The Prometheus text of every worker's metrics, or of this process alone """
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry)
+
+
+request_metrics = RequestMetrics()
@@ -1,8 +1,73 @@
+import logging
+import sqlite3
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, ForeignKey, Integer, String, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Integer, String, Date, bindparam, event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import relationship, Session
+from schemas import Schema
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked, PostgreSQL always enforces them
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def dialect_insert(table):
+    """ INSERT supporting ON CONFLICT for the PostgreSQL and SQLite databases we run on """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError('ON CONFLICT is not supported on %s' % dialect)
+
+def favorites_statements(user_id, limit=None, planets_after=None, people_after=None):
+    """
+    One joined SELECT per favorite kind returning the favorite record id,
+    the item id and its name, ordered by favorite id and paged with the
+    matching ``*_after`` cursor when ``limit`` is given (one extra row is
+    fetched to know if there is a next page).
+    """
+    planets = db.select(FavoritePlanets.id.label('favorite_id'), Planets.id, Planets.planet_name.label('name')) \
+        .join(Planets, FavoritePlanets.planet_fav_id == Planets.id) \
+        .where(FavoritePlanets.user_fav_id == user_id)
+    if planets_after is not None:
+        planets = planets.where(FavoritePlanets.id > planets_after)
+    people = db.select(FavoritePeople.id.label('favorite_id'), People.id, People.name) \
+        .join(People, FavoritePeople.people_fav_id == People.id) \
+        .where(FavoritePeople.user_fav_id == user_id)
+    if people_after is not None:
+        people = people.where(FavoritePeople.id > people_after)
+    planets = planets.order_by(FavoritePlanets.id)
+    people = people.order_by(FavoritePeople.id)
+    if limit is not None:
+        planets = planets.limit(limit + 1)
+        people = people.limit(limit + 1)
+    return planets, people
+
+def _favorite_page(rows, limit):
+    rows = [row._asdict() for row in rows]
+    if limit is not None and len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['favorite_id']
+    return rows, None
+
+def favorites_result(planet_rows, people_rows, limit=None):
+    fav_planet_list, planets_next = _favorite_page(planet_rows, limit)
+    fav_people_list, people_next = _favorite_page(people_rows, limit)
+    return {"favorite_planets":fav_planet_list,
+            "favorite_people":fav_people_list,
+            "planets_next":planets_next,
+            "people_next":people_next}
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,108 +75,150 @@ class User(db.Model):
     user_name = db.Column(db.String(50), nullable=False)
     full_name = db.Column(db.String(100))
     password = db.Column(db.String(80), unique=False, nullable=False)
-    is_active = db.Column(db.Boolean(), unique=False, nullable=False)
+    is_active = db.Column(db.Boolean(), unique=False, nullable=False, default=True, info={'read_only': True})
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    # output key -> column of serialize() and the list endpoints, never the password
+    serialize_columns = {'id': 'id', 'email': 'email', 'user_name': 'user_name', 'full_name': 'full_name'}
 
     fav_planet = db.relationship('FavoritePlanets',back_populates='user')
     fav_people = db.relationship('FavoritePeople', back_populates='user_fav')
 
-    def __init__(self,email,user_name,full_name,password):
-        self.email = email
-        self.user_name = user_name
-        self.full_name = full_name
-        self.password = password
-        self.is_active = True
-
-    def favorites(self):
-        fav_planet_list = [favorite_planet.planet.planet_name for favorite_planet in self.fav_planet]
-        fav_people_list = [favorite_people.fav_people.name for favorite_people in self.fav_people]
-        return {"favorite_planets":fav_planet_list,
-                "favorite_people":fav_people_list}
+    def favorites(self, limit=None, planets_after=None, people_after=None):
+        """
+        Favorite planets and people with their names, one joined query per
+        kind whatever the number of favorites, see ``favorites_statements``.
+        """
+        planets, people = favorites_statements(self.id, limit, planets_after, people_after)
+        return favorites_result(db.session.execute(planets), db.session.execute(people), limit)
     
     def __repr__(self):
         return '<User %r>' % self.user_name
-
-    def serialize(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            "user_name": self.user_name,
-            "full_name": self.full_name
-            # do not serialize the password, its a security breach
-        }
     
 class Planets(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     planet_name = db.Column(db.String(50), unique=True)
     population = db.Column(db.String(40),nullable=True)
-    climate = db.Column(db.String(25),nullable=True)
+    climate = db.Column(db.String(25),nullable=True,index=True)
     diameter = db.Column(db.Integer,nullable=True)
     gravity = db.Column(db.String(15),nullable=True)
     picture_url = db.Column(db.String(300),nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    # optimistic locking: ORM updates check and increment it, see update_returning for Core ones
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
 
-    planet_fav = db.relationship('FavoritePlanets', back_populates='planet')
+    # output key -> column of serialize() and the list endpoints
+    serialize_columns = {'planet': 'planet_name', 'population': 'population', 'picture_url': 'picture_url',
+                         'climate': 'climate', 'diameter': 'diameter', 'gravity': 'gravity', 'id': 'id'}
 
-    def __init__(self,planet_name,population,climate,diameter,gravity,picture_url):
-        self.planet_name = planet_name
-        self.population = population
-        self.climate = climate
-        self.diameter = diameter
-        self.gravity = gravity
-        self.picture_url = picture_url
+    # deleting a planet deletes its favorites with Core statements, see drop_favorites
+    planet_fav = db.relationship('FavoritePlanets', back_populates='planet', passive_deletes='all')
 
     def __repr__(self):
         return '<Planet %r>' % self.planet_name
-    
-    def serialize(self):
-        return {
-            "planet": self.planet_name,
-            "population": self.population,
-            "picture_url":self.picture_url,
-            "climate":self.climate,
-            "diameter":self.diameter,
-            "gravity":self.diameter,
-            "id":self.id
-        }
 
 class People(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True)
     birth_year = db.Column(db.String(15), nullable=False)
-    gender = db.Column(db.String(10),nullable=True)
+    gender = db.Column(db.String(10),nullable=True,index=True)
     height = db.Column(db.String(10),nullable=True)
     hair_color = db.Column(db.String(10),nullable=True)
-    homeworld = db.Column(db.String(25), nullable=True)
+    homeworld_id = db.Column(db.Integer, ForeignKey(Planets.id, ondelete='SET NULL'), nullable=True, index=True)
     picture_url = db.Column(db.String(300), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
+
+    # output key -> column of serialize() and the list endpoints
+    serialize_columns = {'id': 'id', 'name': 'name', 'birth_year': 'birth_year', 'gender': 'gender', 'height': 'height',
+                         'hair_color': 'hair_color', 'homeworld': 'homeworld', 'homeworld_id': 'homeworld_id',
+                         'picture_url': 'picture_url'}
 
-    people_fav = db.relationship('FavoritePeople', back_populates='fav_people')
+    # names used by the list endpoints that are not people columns, read through list_joins
+    list_expressions = {'homeworld': Planets.planet_name}
+    list_joins = ('homeworld_planet',)
 
-    def __init__(self,name,birth_year,gender,height,hair_color,homeworld,picture_url):
-        self.name = name
-        self.birth_year = birth_year
-        self.gender = gender
-        self.height = height
-        self.hair_color = hair_color
-        self.homeworld = homeworld
-        self.picture_url = picture_url
+    people_fav = db.relationship('FavoritePeople', back_populates='fav_people', passive_deletes='all')
+    homeworld_planet = db.relationship(Planets, lazy='joined')
 
     def __repr__(self):
         return '<People %r>' % self.name
-    
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "birth_year": self.birth_year,
-            "gender": self.gender,
-            "height": self.height,
-            "hair_color": self.hair_color,
-            "homeworld":self.homeworld,
-            "picture_url": self.picture_url
-        }
+
+    @property
+    def homeworld(self):
+        return self.homeworld_planet.planet_name if self.homeworld_planet is not None else None
+
+# request validation and serialize() of the catalog models, compiled once from their columns
+for _model in (User, Planets, People):
+    _model.schema = Schema(_model)
+    _model.serialize = _model.schema.dump
+
+def resolve_homeworlds(items):
+    """
+    Set ``homeworld_id`` on every item dict sent with a ``homeworld`` planet
+    name, and check the ``homeworld_id`` sent by the others, with one IN
+    query for the whole list. Returns the names and ids that match no
+    planet.
+    """
+    names = {item['homeworld'] for item in items
+             if isinstance(item, dict) and item.get('homeworld') and item.get('homeworld_id') is None}
+    ids = {item['homeworld_id'] for item in items if isinstance(item, dict)
+           and isinstance(item.get('homeworld_id'), int) and not isinstance(item['homeworld_id'], bool)}
+    if not names and not ids:
+        return set()
+    found = dict(db.session.execute(db.select(Planets.planet_name, Planets.id)
+                                    .where(db.or_(Planets.planet_name.in_(names), Planets.id.in_(ids)))).all())
+    for item in items:
+        if isinstance(item, dict) and item.get('homeworld') in found and item.get('homeworld_id') is None:
+            item['homeworld_id'] = found[item['homeworld']]
+    return (names - set(found)) | (ids - set(found.values()))
+
+def returning_columns(model):
+    """
+    The serialize() keys of a model as RETURNING expressions: its columns,
+    and the names of list_expressions as correlated subqueries through the
+    list_joins relationship to their table.
+    """
+    table = model.__table__
+    joins = [getattr(model, name).property for name in getattr(model, 'list_joins', ())]
+    columns = []
+    for key, name in model.serialize_columns.items():
+        if name in table.c:
+            columns.append(table.c[name].label(key))
+            continue
+        expression = model.list_expressions[name]
+        join = next(relationship for relationship in joins if relationship.mapper.class_ is expression.class_)
+        columns.append(db.select(expression).where(join.primaryjoin).scalar_subquery().label(key))
+    return columns
+
+def update_returning(model, criteria, values, version=None):
+    """
+    One UPDATE ... RETURNING of the row matching ``criteria``, instead of a
+    SELECT then an UPDATE. It increments version_id and, when ``version``
+    is given, only matches the row still at that version (optimistic
+    locking). Returns the serialized row and its new version_id, or
+    (None, None) when no row matched.
+    """
+    table = model.__table__
+    stmt = table.update().where(*criteria).values(version_id=table.c.version_id + 1, updated_at=utcnow(), **values)
+    if version is not None:
+        stmt = stmt.where(table.c.version_id == version)
+    row = db.session.execute(stmt.returning(table.c.version_id.label('_version_id'), *returning_columns(model))) \
+        .mappings().one_or_none()
+    if row is None:
+        return None, None
+    bump_versions(db.session.connection(), [VERSIONED_TABLES[table.name]])
+    row = dict(row)
+    return row, row.pop('_version_id')
 
 class FavoritePlanets(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_fav_id', 'planet_fav_id', name='uq_favorite_planets_user_planet'),)
     id = db.Column(db.Integer, primary_key=True)
-    planet_fav_id = db.Column(db.Integer, ForeignKey(Planets.id))
+    planet_fav_id = db.Column(db.Integer, ForeignKey(Planets.id), index=True)
+    item_column = 'planet_fav_id'
+    kind = 'planets'
     user_fav_id = db.Column(db.Integer,ForeignKey(User.id))
     user = db.relationship(User, back_populates='fav_planet')
     planet = db.relationship(Planets, back_populates='planet_fav')
@@ -130,8 +237,11 @@ class FavoritePlanets(db.Model):
                 }
 
 class FavoritePeople(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_fav_id', 'people_fav_id', name='uq_favorite_people_user_people'),)
     id = db.Column(db.Integer,primary_key=True)
-    people_fav_id = db.Column(db.Integer, ForeignKey(People.id))
+    people_fav_id = db.Column(db.Integer, ForeignKey(People.id), index=True)
+    item_column = 'people_fav_id'
+    kind = 'people'
     user_fav_id = db.Column(db.Integer,ForeignKey(User.id))
     user_fav = db.relationship(User,back_populates='fav_people')
     fav_people = db.relationship(People, back_populates='people_fav')
@@ -148,3 +258,274 @@ class FavoritePeople(db.Model):
                 'user_fav_id':self.user_fav.user_name,
                 'people_fav_id':self.fav_people.name
                 }
+
+class FavoriteCount(db.Model):
+    """
+    How many users have each person or planet as favorite, kept up to date
+    in the transaction of every favorite insert and delete so the top
+    favorites are read from the ix_favorite_count_top index.
+    """
+    __tablename__ = 'favorite_count'
+    kind = db.Column(db.String(10), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    favorites = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_favorite_count_top', kind, favorites.desc(), item_id),)
+
+    def __repr__(self):
+        return '<FavoriteCount %s %r: %r>' % (self.kind, self.item_id, self.favorites)
+
+# kind -> (favorite model, item model, item name column)
+FAVORITE_KINDS = {
+    'people': (FavoritePeople, People, People.name),
+    'planets': (FavoritePlanets, Planets, Planets.planet_name),
+}
+
+def count_favorites(connection, kind, item_ids, delta):
+    """ Add delta to the favorites counter of every item, in the caller's transaction """
+    table = FavoriteCount.__table__
+    if not item_ids:
+        return
+    if delta > 0:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=['kind', 'item_id'],
+                                          set_={'favorites': table.c.favorites + stmt.excluded.favorites})
+        connection.execute(stmt, [{'kind': kind, 'item_id': item_id, 'favorites': delta} for item_id in item_ids])
+    else:
+        stmt = table.update().where(table.c.kind == kind, table.c.item_id == bindparam('_item_id')) \
+            .values(favorites=table.c.favorites + delta)
+        connection.execute(stmt, [{'_item_id': item_id} for item_id in item_ids])
+
+def drop_favorites(session, kind, item_ids):
+    """
+    Delete the favorites and the favorite_count row of deleted items, in the
+    caller's transaction: SQLite may give a deleted id to the next item,
+    which must not inherit its counter.
+    """
+    model = FAVORITE_KINDS[kind][0]
+    table = model.__table__
+    counts = FavoriteCount.__table__
+    session.execute(table.delete().where(table.c[model.item_column].in_(item_ids)))
+    session.execute(counts.delete().where(counts.c.kind == kind, counts.c.item_id.in_(item_ids)))
+    bump_versions_after_commit(session, ['favorites'])
+
+def top_favorites(kind, limit):
+    """ The limit most favorite items of a kind with their name, most favorite first """
+    model, item_model, name = FAVORITE_KINDS[kind]
+    stmt = db.select(item_model.id, name.label('name'), FavoriteCount.favorites) \
+        .join(item_model, item_model.id == FavoriteCount.item_id) \
+        .where(FavoriteCount.kind == kind, FavoriteCount.favorites > 0) \
+        .order_by(FavoriteCount.favorites.desc(), FavoriteCount.item_id).limit(limit)
+    return [row._asdict() for row in db.session.execute(stmt)]
+
+def rebuild_favorite_counts():
+    """
+    Recount favorite_count from the favorite tables, for data loaded or
+    edited around add_favorite/remove_favorite. Returns the rows per kind.
+    """
+    table = FavoriteCount.__table__
+    connection = db.session.connection()
+    connection.execute(table.delete())
+    counted = {}
+    for kind, (model, item_model, name) in FAVORITE_KINDS.items():
+        item_id = model.__table__.c[model.item_column]
+        select = db.select(db.literal(kind), item_id, func.count()) \
+            .where(item_id.is_not(None)).group_by(item_id)
+        counted[kind] = connection.execute(table.insert().from_select(['kind', 'item_id', 'favorites'],
+                                                                       select)).rowcount
+    return counted
+
+class TableVersion(db.Model):
+    """ Write counter per group of tables, the source of the ETags of the list endpoints """
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return '<TableVersion %r %r>' % (self.name, self.version)
+
+# table name -> TableVersion name bumped when it changes
+VERSIONED_TABLES = {
+    'user': 'user',
+    'people': 'people',
+    'planets': 'planets',
+    'favorite_people': 'favorites',
+    'favorite_planets': 'favorites',
+}
+
+def bump_versions(connection, names):
+    """ Increment the version of every name, in the caller's transaction """
+    table = TableVersion.__table__
+    now = utcnow()
+    for name in set(names):
+        result = connection.execute(table.update().where(table.c.name == name)
+                                    .values(version=table.c.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+# every user writes favorites: bumping their shared row in the write transaction
+# would hold its lock until commit and serialize all favorite writes
+AFTER_COMMIT_VERSIONS = {'favorites'}
+
+def bump_versions_after_commit(session, names):
+    """
+    Increment the version of every name once ``session`` commits, in a
+    transaction of its own that only holds the row lock for the UPDATE.
+    Until then readers may see the new rows under the old version, never
+    the old rows under the new one, so no stale response gets cached
+    under the new validator.
+    """
+    session.info.setdefault('versions_after_commit', set()).update(names)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_versions(session):
+    names = session.info.pop('versions_after_commit', None)
+    if not names:
+        return
+    try:
+        with session.get_bind().begin() as connection:
+            bump_versions(connection, names)
+    except Exception:
+        # the write is committed, the version catches up with the next one
+        logger.exception('could not bump the versions of %s', ', '.join(sorted(names)))
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_committed_versions(session):
+    session.info.pop('versions_after_commit', None)
+
+def touch_residents(session, planet_ids, deleted=False):
+    # people serialize their homeworld name, renaming or deleting a planet changes its residents
+    people = People.__table__
+    values = {'updated_at': utcnow(), 'version_id': people.c.version_id + 1}
+    if deleted:
+        values['homeworld_id'] = None
+    session.execute(people.update().where(people.c.homeworld_id.in_(planet_ids)).values(values))
+    bump_versions(session.connection(), ['people'])
+
+@event.listens_for(Session, 'before_flush')
+def _touch_residents(session, flush_context, instances):
+    deleted = [planet.id for planet in session.deleted if isinstance(planet, Planets)]
+    renamed = [planet.id for planet in session.dirty if isinstance(planet, Planets)
+               and db.inspect(planet).attrs.planet_name.history.has_changes()]
+    if deleted:
+        touch_residents(session, deleted, deleted=True)
+    if renamed:
+        touch_residents(session, renamed)
+
+@event.listens_for(Session, 'before_flush')
+def _drop_deleted_favorites(session, flush_context, instances):
+    for kind, (model, item_model, name) in FAVORITE_KINDS.items():
+        deleted = [item.id for item in session.deleted if isinstance(item, item_model)]
+        if deleted:
+            drop_favorites(session, kind, deleted)
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_versions(session, flush_context):
+    # ORM writes; Core bulk statements call bump_versions themselves
+    names = [VERSIONED_TABLES.get(instance.__table__.name)
+             for instance in list(session.new) + list(session.dirty) + list(session.deleted)]
+    names = set(name for name in names if name is not None)
+    if names - AFTER_COMMIT_VERSIONS:
+        bump_versions(session.connection(), names - AFTER_COMMIT_VERSIONS)
+    if names & AFTER_COMMIT_VERSIONS:
+        bump_versions_after_commit(session, names & AFTER_COMMIT_VERSIONS)
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_favorites(session, flush_context):
+    # favorites added or removed through the ORM (the admin); the API goes through add_favorite/remove_favorite
+    for instances, delta in ((session.new, 1), (session.deleted, -1)):
+        for favorite in instances:
+            if isinstance(favorite, (FavoritePeople, FavoritePlanets)):
+                item_id = getattr(favorite, favorite.item_column)
+                if item_id is not None:
+                    count_favorites(session.connection(), favorite.kind, [item_id], delta)
+
+def add_favorite(model, item_model, user_id, item_id):
+    """
+    Single statement INSERT ... SELECT ... WHERE EXISTS that only inserts when
+    both the user and the item exist and skips pairs that are already
+    favorite. Returns the new favorite id, or None when nothing was inserted.
+    """
+    table = model.__table__
+    item_column = model.item_column
+    exists = db.select(db.literal(item_id, Integer), db.literal(user_id, Integer)).where(
+        db.select(item_model.id).where(item_model.id == item_id).exists(),
+        db.select(User.id).where(User.id == user_id).exists())
+    stmt = dialect_insert(table).from_select([item_column, 'user_fav_id'], exists) \
+        .on_conflict_do_nothing(index_elements=['user_fav_id', item_column]).returning(table.c.id)
+    new_id = db.session.execute(stmt).scalar()
+    if new_id is not None:
+        count_favorites(db.session.connection(), model.kind, [item_id], 1)
+        bump_versions_after_commit(db.session, ['favorites'])
+    return new_id
+
+def remove_favorite(model, user_id, item_id):
+    """ Single statement DELETE ... RETURNING, returns the deleted favorite id or None """
+    table = model.__table__
+    stmt = table.delete().where(table.c.user_fav_id == user_id, table.c[model.item_column] == item_id) \
+        .returning(table.c.id)
+    deleted_id = db.session.execute(stmt).scalar()
+    if deleted_id is not None:
+        count_favorites(db.session.connection(), model.kind, [item_id], -1)
+        bump_versions_after_commit(db.session, ['favorites'])
+    return deleted_id
+
+def update_favorites(user_id, add, remove=None, replace=False):
+    """
+    Bulk change the favorites of a user. ``add`` and ``remove`` map a kind
+    of FAVORITE_KINDS to item ids; with ``replace`` the current favorites of
+    every kind that are not in ``add`` are removed too. Per kind, one IN
+    query validates the ids and one reads the current favorites, then one
+    executemany INSERT, one DELETE and the counter updates apply the diff,
+    all in the caller's transaction. Returns one result dict per id.
+    """
+    remove = remove or {}
+    results, changed = [], False
+    for kind, (model, item_model, name) in FAVORITE_KINDS.items():
+        wanted, unwanted = list(dict.fromkeys(add.get(kind, []))), list(dict.fromkeys(remove.get(kind, [])))
+        if not wanted and not unwanted and not replace:
+            continue
+        table = model.__table__
+        item_column = table.c[model.item_column]
+        existing = set(db.session.execute(db.select(item_model.id).where(item_model.id.in_(wanted))).scalars()) \
+            if wanted else set()
+        # favorites of a deleted item have a NULL item id, they are not current
+        current = set(db.session.execute(db.select(item_column)
+                                         .where(table.c.user_fav_id == user_id, item_column.is_not(None))).scalars())
+
+        inserts, deletes, wanted_ids = [], [], set(wanted)
+        for item_id in wanted:
+            if item_id not in existing:
+                results.append({'kind': kind, 'id': item_id, 'status': 'error', 'msg': kind + ' does not exist'})
+            elif item_id in current:
+                results.append({'kind': kind, 'id': item_id, 'status': 'unchanged'})
+            else:
+                inserts.append(item_id)
+        for item_id in unwanted:
+            if item_id in current and item_id not in wanted_ids:
+                deletes.append(item_id)
+            else:
+                results.append({'kind': kind, 'id': item_id, 'status': 'unchanged', 'msg': 'not a favorite'})
+        if replace:
+            deletes += sorted(current - wanted_ids - set(deletes))
+
+        added = removed = set()
+        if inserts:
+            stmt = dialect_insert(table).on_conflict_do_nothing(index_elements=['user_fav_id', model.item_column]) \
+                .returning(item_column)
+            added = set(db.session.execute(stmt, [{'user_fav_id': user_id, model.item_column: item_id}
+                                                  for item_id in inserts]).scalars())
+            count_favorites(db.session.connection(), kind, added, 1)
+        if deletes:
+            stmt = table.delete().where(table.c.user_fav_id == user_id, item_column.in_(deletes)).returning(item_column)
+            removed = set(db.session.execute(stmt).scalars())
+            count_favorites(db.session.connection(), kind, removed, -1)
+        # rows another request added or removed meanwhile are reported unchanged
+        results += [{'kind': kind, 'id': item_id, 'status': 'added' if item_id in added else 'unchanged'}
+                    for item_id in inserts]
+        results += [{'kind': kind, 'id': item_id, 'status': 'removed' if item_id in removed else 'unchanged'}
+                    for item_id in deletes]
+        changed = changed or bool(added) or bool(removed)
+    if changed:
+        bump_versions_after_commit(db.session, ['favorites'])
+    return results
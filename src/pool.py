@@ -0,0 +1,117 @@
+"""
+Database connection pool settings read from the environment, and pool metrics.
+
+DB_POOL_SIZE        connections kept open per worker (default 5)
+DB_MAX_OVERFLOW     extra connections allowed under load (default 10)
+DB_POOL_TIMEOUT     seconds to wait for a free connection (default 30)
+DB_POOL_RECYCLE     seconds before a connection is replaced, keep it under
+                    the server/proxy idle timeout (default 300)
+DB_POOL_PRE_PING    test connections on checkout, drops dead ones (default 1)
+DB_PGBOUNCER        1 when connecting through PgBouncer in transaction mode:
+                    pooling is left to PgBouncer (NullPool). psycopg2 never
+                    uses server side prepared statements so nothing else changes.
+"""
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from metrics import POOL_CHECKOUTS, POOL_CONNECTS, POOL_INVALIDATIONS
+
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(database_uri):
+    """ Value for SQLALCHEMY_ENGINE_OPTIONS """
+    options = {'pool_pre_ping': env_flag('DB_POOL_PRE_PING', '1')}
+    if database_uri.startswith('sqlite'):
+        return options
+    if env_flag('DB_PGBOUNCER', '0'):
+        options['poolclass'] = NullPool
+        return options
+    options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 300)),
+    })
+    return options
+
+
+class PoolStats:
+    """ The counters of the pool of one engine """
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.connect_seconds = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        event.listen(self.engine, 'do_connect', self._before_connect)
+        event.listen(self.engine.pool, 'connect', self._on_connect)
+        event.listen(self.engine.pool, 'checkout', self._on_checkout)
+        event.listen(self.engine.pool, 'checkin', self._on_checkin)
+        event.listen(self.engine.pool, 'invalidate', self._on_invalidate)
+
+    def _before_connect(self, dialect, conn_rec, cargs, cparams):
+        self._local.connect_started = time.perf_counter()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        started = getattr(self._local, 'connect_started', None)
+        with self._lock:
+            self.connects += 1
+            POOL_CONNECTS.inc()
+            if started is not None:
+                self.connect_seconds += time.perf_counter() - started
+        self._local.connect_started = None
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            POOL_CHECKOUTS.inc()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+            POOL_INVALIDATIONS.inc()
+
+    def stats(self):
+        pool = self.engine.pool
+        stats = {'pool': type(pool).__name__,
+                 'status': pool.status(),
+                 'checkouts': self.checkouts,
+                 'checkins': self.checkins,
+                 'connects': self.connects,
+                 'invalidations': self.invalidations,
+                 'connect_ms_total': round(self.connect_seconds * 1000, 3)}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        return stats
+
+
+class PoolMetrics:
+    """
+    Counters fed by the engine pool events, per process and per app (in
+    ``app.extensions['pool_metrics']``) for /internal/pool, exported to
+    /metrics for all workers (see metrics.py). SQLAlchemy has no event for the
+    time spent waiting on a busy pool, so saturation shows up as checked_out
+    reaching size + overflow, and as the time spent opening new connections.
+    """
+    def init_app(self, app, db):
+        with app.app_context():
+            app.extensions['pool_metrics'] = PoolStats(db.engine)
+
+    def stats(self):
+        return current_app.extensions['pool_metrics'].stats()
+
+
+pool_metrics = PoolMetrics()
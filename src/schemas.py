@@ -0,0 +1,90 @@
+"""
+Request validation and serialization compiled once per model, when the
+models are imported, from their SQLAlchemy column metadata.
+
+The writable fields of a model are its columns except the primary key, the
+version_id_col, the columns the ORM keeps up to date (onupdate) and those
+marked ``info={'read_only': True}``. Each one gets a check built from its
+column type, length and nullability, so a bad request body is rejected
+before any query instead of failing inside commit(). The names of the
+model's ``list_expressions`` are checked like the column they read, for
+bodies that may send them (a homeworld name), but are never written.
+
+``dump`` serializes an instance to the model's ``serialize_columns`` with
+a single attrgetter, and replaces the hand-written serialize() methods.
+"""
+from operator import attrgetter
+
+
+def _type_check(column):
+    """ (test, error message) for the non-null values of ``column`` """
+    python_type = column.type.python_type
+    if python_type is bool:
+        return (lambda value: isinstance(value, bool)), 'must be a boolean'
+    if python_type is int:
+        return (lambda value: isinstance(value, int) and not isinstance(value, bool)), 'must be an integer'
+    if python_type is float:
+        return (lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)), 'must be a number'
+    if python_type is str:
+        length = column.type.length
+        if length is None:
+            return (lambda value: isinstance(value, str)), 'must be a string'
+        return (lambda value: isinstance(value, str) and len(value) <= length), \
+            'must be a string of at most %d characters' % length
+    return (lambda value: isinstance(value, python_type)), 'must be a %s' % python_type.__name__
+
+
+class Schema:
+    def __init__(self, model):
+        version_column = model.__mapper__.version_id_col
+        self.checks = {}
+        fields = []
+        for column in model.__table__.columns:
+            if (column.primary_key or column.onupdate is not None or column is version_column
+                    or column.info.get('read_only')):
+                continue
+            test, message = _type_check(column)
+            self.checks[column.key] = (column.nullable, test, message)
+            fields.append(column.key)
+        for name, expression in getattr(model, 'list_expressions', {}).items():
+            test, message = _type_check(expression.property.columns[0])
+            self.checks[name] = (True, test, message)
+        self.fields = tuple(fields)
+
+        keys = tuple(model.serialize_columns)
+        getter = attrgetter(*model.serialize_columns.values())
+
+        def dump(instance):
+            return dict(zip(keys, getter(instance)))
+        self.dump = dump
+
+    def errors(self, data, partial=False, required=()):
+        """
+        Field -> error message for the dict ``data``, empty when it is
+        valid. With ``partial`` only the fields sent are checked, otherwise
+        every writable field is, an omitted one counting as null. Names
+        without a check are left to the caller.
+        """
+        errors = {}
+        names = data if partial else self.fields + tuple(name for name in data if name not in self.fields)
+        for name in names:
+            check = self.checks.get(name)
+            if check is None:
+                continue
+            nullable, test, message = check
+            value = data.get(name)
+            if value is None:
+                if not nullable:
+                    errors[name] = 'can not be null' if name in data else 'is required'
+            elif not test(value):
+                errors[name] = message
+        for name in required:
+            if data.get(name) is None:
+                errors[name] = 'is required'
+        return errors
+
+    def values(self, data, partial=False):
+        """ The writable column values of a valid ``data``, None for omitted ones unless ``partial`` """
+        if partial:
+            return {name: value for name, value in data.items() if name in self.fields}
+        return {name: data.get(name) for name in self.fields}
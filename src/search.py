@@ -0,0 +1,102 @@
+"""
+Prefix full-text search over People (name, homeworld) and Planets (planet_name, climate).
+
+- PostgreSQL: ranked with ts_rank over GIN indexes. Planets use an expression
+  index on to_tsvector('simple', ...). People have a search_document column,
+  the tsvector of their name and homeworld name together like the SQLite
+  row, kept up to date by triggers on people and on planet renames.
+- SQLite: an FTS5 table, search_index, kept in sync by triggers on people and
+  planets (a planet rename re-indexes its residents), ranked with bm25. Its
+  rowid encodes the row: people id * 2 and planets id * 2 + 1, so triggers
+  update it by rowid.
+
+The migration creates the same objects; the DDL below also runs on
+db.create_all() so test and benchmark databases can search too.
+"""
+import re
+from sqlalchemy import DDL, event, text
+from models import db
+
+HOMEWORLD_NAME = '(SELECT planet_name FROM planets WHERE planets.id = new.homeworld_id)'
+PLANETS_DOCUMENT = "to_tsvector('simple', coalesce(planet_name, '') || ' ' || coalesce(climate, ''))"
+
+POSTGRESQL_DDL = [
+    'ALTER TABLE people ADD COLUMN IF NOT EXISTS search_document tsvector',
+    "CREATE OR REPLACE FUNCTION people_search_document() RETURNS trigger AS $$ BEGIN "
+    "new.search_document := to_tsvector('simple', coalesce(new.name, '') || ' ' || coalesce(%s, '')); "
+    "RETURN new; END $$ LANGUAGE plpgsql" % HOMEWORLD_NAME,
+    'DROP TRIGGER IF EXISTS people_search_document ON people',
+    'CREATE TRIGGER people_search_document BEFORE INSERT OR UPDATE OF name, homeworld_id ON people '
+    'FOR EACH ROW EXECUTE FUNCTION people_search_document()',
+    "CREATE OR REPLACE FUNCTION planets_search_rename() RETURNS trigger AS $$ BEGIN "
+    "UPDATE people SET search_document = to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(new.planet_name, '')) "
+    "WHERE homeworld_id = new.id; RETURN NULL; END $$ LANGUAGE plpgsql",
+    'DROP TRIGGER IF EXISTS planets_search_rename ON planets',
+    'CREATE TRIGGER planets_search_rename AFTER UPDATE OF planet_name ON planets '
+    'FOR EACH ROW EXECUTE FUNCTION planets_search_rename()',
+    'CREATE INDEX IF NOT EXISTS ix_people_search ON people USING gin (search_document)',
+    'CREATE INDEX IF NOT EXISTS ix_planets_search ON planets USING gin (%s)' % PLANETS_DOCUMENT,
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(name, extra, tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS people_search_insert AFTER INSERT ON people BEGIN "
+    "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, %s); END" % HOMEWORLD_NAME,
+    "CREATE TRIGGER IF NOT EXISTS people_search_update AFTER UPDATE ON people BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; "
+    "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2, new.name, %s); END" % HOMEWORLD_NAME,
+    "CREATE TRIGGER IF NOT EXISTS people_search_delete AFTER DELETE ON people BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS planets_search_insert AFTER INSERT ON planets BEGIN "
+    "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2 + 1, new.planet_name, new.climate); END",
+    "CREATE TRIGGER IF NOT EXISTS planets_search_update AFTER UPDATE ON planets BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+    "INSERT INTO search_index(rowid, name, extra) VALUES (new.id * 2 + 1, new.planet_name, new.climate); END",
+    "CREATE TRIGGER IF NOT EXISTS planets_search_delete AFTER DELETE ON planets BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS planets_search_rename AFTER UPDATE OF planet_name ON planets BEGIN "
+    "DELETE FROM search_index WHERE rowid IN (SELECT id * 2 FROM people WHERE homeworld_id = new.id); "
+    "INSERT INTO search_index(rowid, name, extra) "
+    "SELECT id * 2, name, new.planet_name FROM people WHERE homeworld_id = new.id; END",
+]
+
+for statement in POSTGRESQL_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL('DROP TABLE IF EXISTS search_index').execute_if(dialect='sqlite'))
+for function in ('people_search_document', 'planets_search_rename'):
+    event.listen(db.metadata, 'before_drop',
+                 DDL('DROP FUNCTION IF EXISTS %s() CASCADE' % function).execute_if(dialect='postgresql'))
+
+POSTGRESQL_SEARCH = text("""
+    SELECT 'people' AS kind, id, name, ts_rank(search_document, query) AS score
+    FROM people, to_tsquery('simple', :query) AS query WHERE search_document @@ query
+    UNION ALL
+    SELECT 'planets' AS kind, id, planet_name AS name, ts_rank(%s, query) AS score
+    FROM planets, to_tsquery('simple', :query) AS query WHERE %s @@ query
+    ORDER BY score DESC, kind, id LIMIT :limit OFFSET :offset
+""" % (PLANETS_DOCUMENT, PLANETS_DOCUMENT))
+
+SQLITE_SEARCH = text("""
+    SELECT CASE rowid % 2 WHEN 0 THEN 'people' ELSE 'planets' END AS kind,
+           rowid / 2 AS id, name, -bm25(search_index) AS score
+    FROM search_index WHERE search_index MATCH :query
+    ORDER BY bm25(search_index), rowid LIMIT :limit OFFSET :offset
+""")
+
+def search_terms(q):
+    return re.findall(r'\w+', q.lower())
+
+def search(q, limit, offset):
+    """ Ranked rows (kind, id, name, score) matching every word of q as a prefix """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        stmt, query = POSTGRESQL_SEARCH, ' & '.join(term + ':*' for term in terms)
+    else:
+        stmt, query = SQLITE_SEARCH, ' '.join('"%s"*' % term for term in terms)
+    result = db.session.execute(stmt, {'query': query, 'limit': limit, 'offset': offset})
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
@@ -0,0 +1,100 @@
+"""
+The / sitemap and the /routes JSON index of every endpoint.
+
+Both only depend on the url map, so they are built once, on their first
+request (when the admin and every route are registered), and served from
+then on as precomputed bytes, kept per app in ``app.extensions['sitemap']``, compressed once per negotiated encoding, with
+an ETag and a Cache-Control max-age (SITEMAP_MAX_AGE seconds, default 300).
+"""
+import os
+import threading
+import zlib
+from flask import current_app, request
+from compression import compressor
+from utils import generate_sitemap
+
+HIDDEN_METHODS = {'HEAD', 'OPTIONS'}
+CONVERTER_TYPES = {'IntegerConverter': 'int', 'FloatConverter': 'float', 'PathConverter': 'path',
+                   'UUIDConverter': 'uuid', 'UnicodeConverter': 'string', 'AnyConverter': 'string'}
+
+
+class Page:
+    """ A response body computed once, with its ETag and compressed encodings """
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = '%08x' % zlib.crc32(body)
+        self.encoded = {}
+
+    def encode(self, encoding):
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compressor.compress(self.body, encoding)
+        return self.encoded[encoding]
+
+    def response(self, max_age):
+        response = current_app.response_class(mimetype=self.mimetype)
+        encoding = compressor.negotiate(request.headers.get('Accept-Encoding'))
+        response.set_etag(self.etag, weak=encoding is not None)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.vary.add('Accept-Encoding')
+        if request.if_none_match.contains_weak(self.etag):
+            response.status_code = 304
+        elif encoding is not None:
+            response.set_data(self.encode(encoding))
+            response.content_encoding = encoding
+        else:
+            response.set_data(self.body)
+        return response
+
+
+def route_index(app):
+    """ Every url rule with its endpoint, methods and typed parameters """
+    routes = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == 'static' or rule.rule.startswith('/admin'):
+            continue
+        routes.append({
+            'path': rule.rule,
+            'endpoint': rule.endpoint,
+            'methods': sorted(rule.methods - HIDDEN_METHODS),
+            'parameters': [{'name': name, 'type': CONVERTER_TYPES.get(type(converter).__name__, 'string')}
+                           for name, converter in rule._converters.items()],
+        })
+    return routes
+
+
+class SitemapState:
+    """ The max-age and the pages, once built, of the sitemap of one app """
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.pages = None
+
+
+class Sitemap:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['sitemap'] = SitemapState(int(os.getenv('SITEMAP_MAX_AGE', 300)))
+
+    def pages(self):
+        state = current_app.extensions['sitemap']
+        if state.pages is None:
+            with self._lock:
+                if state.pages is None:
+                    app = current_app._get_current_object()
+                    state.pages = {
+                        'html': Page(generate_sitemap(app).encode(), 'text/html'),
+                        'routes': Page(app.json.dumps({'routes': route_index(app)}).encode(), 'application/json'),
+                    }
+        return state.pages
+
+    def html(self):
+        return self.pages()['html'].response(current_app.extensions['sitemap'].max_age)
+
+    def routes(self):
+        return self.pages()['routes'].response(current_app.extensions['sitemap'].max_age)
+
+
+sitemap_pages = Sitemap()
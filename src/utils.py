@@ -1,4 +1,11 @@
-from flask import jsonify, url_for
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
+from models import db, bump_versions, VERSIONED_TABLES
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MAX_BATCH_SIZE = 5000
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +22,236 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def list_column(model, name):
+    """ Column or joined expression a list endpoint selects and filters for ``name`` """
+    expressions = getattr(model, 'list_expressions', {})
+    return expressions[name] if name in expressions else getattr(model, name)
+
+def list_query(model, fields, filters, *criteria, args=None):
+    """
+    Build the Core SELECT shared by the list endpoints from the query string
+    (``args``, the current request's by default): ``fields`` (comma separated
+    column names, selected at the SQL level), ``after`` (last id already
+    seen) and equality ``filters``, plus any fixed ``criteria``. Without
+    ``fields`` the columns of the model's ``serialize_columns`` are selected
+    under their output names, so rows go to JSON without building ORM
+    instances. Names that live in another table are read through the
+    model's ``list_joins``.
+    Returns the statement ordered by ``id``.
+    """
+    if args is None:
+        args = request.args
+    requested = args.get('fields')
+    if requested:
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in fields]
+        if unknown:
+            raise APIException('unknown fields: ' + ', '.join(unknown))
+        if 'id' not in names:
+            names.insert(0, 'id')
+        columns = {name: name for name in names}
+    else:
+        columns = model.serialize_columns
+    stmt = db.select(*[list_column(model, column).label(key) for key, column in columns.items()]).select_from(model)
+    for relationship in getattr(model, 'list_joins', ()):
+        stmt = stmt.outerjoin(getattr(model, relationship))
+
+    for name in filters:
+        value = args.get(name)
+        if value is not None:
+            stmt = stmt.where(list_column(model, name) == value)
+    after = args.get('after', type=int)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    return stmt.where(*criteria).order_by(model.id)
+
+def paginate(model, fields, filters, *criteria):
+    """
+    Keyset pagination on ``id``: one page of ``list_query`` of at most
+    ``limit`` rows. Returns the page as a list of dicts and the cursor for
+    the next page.
+    """
+    limit = page_limit()
+    stmt = list_query(model, fields, filters, *criteria)
+    return page_result(db.session.execute(stmt.limit(limit + 1)), limit)
+
+def page_limit(args=None):
+    if args is None:
+        args = request.args
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise APIException('limit must be between 1 and %d' % MAX_PAGE_SIZE)
+    return limit
+
+def page_result(result, limit):
+    """ Turn the ``limit + 1`` rows fetched for a page into (rows, next cursor) """
+    keys = tuple(result.keys())
+    rows = [dict(zip(keys, row)) for row in result]
+    last_id = rows[limit - 1]['id'] if len(rows) > limit else None
+    return rows[:limit], last_id
+
+def wants_stream():
+    if request.args.get('stream') == '1':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def stream_rows(model, fields, filters, *criteria):
+    """
+    Export every row matching ``list_query`` as NDJSON. Rows are fetched
+    ``STREAM_BATCH_SIZE`` at a time (a server-side cursor on PostgreSQL) and
+    written out as they arrive, so memory does not grow with the table.
+    """
+    stmt = list_query(model, fields, filters, *criteria).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    def generate():
+        result = db.session.execute(stmt)
+        keys = tuple(result.keys())
+        dumps = current_app.json.dumps
+        for row in result:
+            yield dumps(dict(zip(keys, row))) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def next_page_url(cursor, param='after'):
+    if cursor is None:
+        return None
+    # the path arguments too, like the <id> of /planets/<id>/residents
+    args = {**request.view_args, **request.args.to_dict()}
+    args[param] = cursor
+    return url_for(request.endpoint, **args)
+
+def batch_items():
+    """ Items of a batch request body, sent as a JSON array or as NDJSON """
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            items = [current_app.json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            raise APIException('invalid NDJSON body')
+    else:
+        items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise APIException('expected a JSON array or NDJSON body')
+    if len(items) > MAX_BATCH_SIZE:
+        raise APIException('a batch can have at most %d items' % MAX_BATCH_SIZE)
+    return items
+
+def id_lists(data, names, disjoint_from=None):
+    """
+    The lists of integer ids sent under each of ``names`` of a JSON object
+    body. Ids also in the lists ``disjoint_from`` (those to add, for the
+    ones to remove) are rejected.
+    """
+    if not isinstance(data, dict):
+        raise APIException('expected a JSON object')
+    lists = {}
+    for name in names:
+        ids = data.get(name, [])
+        if not isinstance(ids, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            raise APIException('%s must be a list of ids' % name)
+        lists[name] = ids
+    if sum(len(ids) for ids in lists.values()) > MAX_BATCH_SIZE:
+        raise APIException('a batch can have at most %d items' % MAX_BATCH_SIZE)
+    if disjoint_from is not None:
+        both = {name: sorted(set(ids) & set(disjoint_from.get(name, ()))) for name, ids in lists.items()}
+        both = {name: ids for name, ids in both.items() if ids}
+        if both:
+            raise APIException('ids both added and removed: ' + '; '.join(
+                '%s %s' % (name, ', '.join(map(str, ids))) for name, ids in both.items()), payload={'both': both})
+    return lists
+
+def validated(model, data, partial=False, required=(), extra=()):
+    """
+    The column values of a request body, checked by the model's compiled
+    schema (see schemas.py) before any query. With ``partial`` (PATCH) only
+    the fields sent are checked and returned, otherwise every writable
+    field is, None when omitted. ``extra`` names the fields accepted that
+    are not written, like a homeworld name.
+    """
+    if not isinstance(data, dict):
+        raise APIException('expected a JSON object')
+    schema = model.schema
+    unknown = [name for name in data if name not in schema.fields and name not in extra]
+    if unknown:
+        raise APIException('unknown fields: ' + ', '.join(unknown))
+    if partial and not data:
+        raise APIException('nothing to update')
+    errors = schema.errors(data, partial, required)
+    if errors:
+        raise APIException('invalid fields: ' + ', '.join(errors), payload={'errors': errors})
+    return schema.values(data, partial)
+
+def batch_upsert(model, key, items, validate=None):
+    """
+    Create or update ``items`` matched on the unique ``key`` column: one
+    ``IN (...)`` query finds the existing rows, then one executemany INSERT
+    and one executemany UPDATE run in a single transaction. Items failing
+    the model's schema are skipped, as are those ``validate`` returns an
+    error message for. Returns one result dict per item, in request order.
+    """
+    table = model.__table__
+    fields = model.schema.fields
+    results = [None] * len(items)
+    pending = {}
+    for index, item in enumerate(items):
+        name = item.get(key) if isinstance(item, dict) else None
+        if not name:
+            results[index] = {'index': index, 'status': 'error', 'msg': key + ' is required'}
+            continue
+        errors = model.schema.errors(item)
+        error = '; '.join('%s %s' % error for error in errors.items()) if errors else None
+        if error is None and validate is not None:
+            error = validate(item)
+        if error:
+            results[index] = {'index': index, key: name, 'status': 'error', 'msg': error}
+            continue
+        if name in pending:
+            first = pending[name]
+            results[first] = {'index': first, key: name, 'status': 'error', 'msg': 'duplicated in batch'}
+        pending[name] = index
+
+    existing = {}
+    if pending:
+        stmt = db.select(table.c[key], table.c.id).where(table.c[key].in_(list(pending)))
+        existing = dict(db.session.execute(stmt).all())
+
+    inserts, updates = [], []
+    for name, index in pending.items():
+        row = {field: items[index].get(field) for field in fields}
+        if name in existing:
+            row['_id'] = existing[name]
+            updates.append(row)
+            results[index] = {'index': index, key: name, 'status': 'updated', 'id': existing[name]}
+        else:
+            inserts.append(row)
+            results[index] = {'index': index, key: name, 'status': 'created'}
+
+    try:
+        if inserts:
+            created = db.session.execute(db.insert(table).returning(table.c[key], table.c.id), inserts)
+            for name, new_id in created:
+                results[pending[name]]['id'] = new_id
+        if updates:
+            values = {field: db.bindparam(field) for field in fields}
+            if 'version_id' in table.c:
+                values['version_id'] = table.c.version_id + 1
+            db.session.execute(db.update(table).where(table.c.id == db.bindparam('_id')).values(values), updates)
+        if inserts or updates:
+            bump_versions(db.session.connection(), [VERSIONED_TABLES[table.name]])
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.error('Error: %s', error)
+        raise APIException('Error saving batch to database', status_code=500)
+    return results
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin.index' in app.view_functions else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,12 @@
+# The Flask-Admin UI in its own process, so the API workers can run with
+# ADMIN_ENABLED=0:
+#   $ gunicorn wsgi_admin --chdir ./src/ --bind 0.0.0.0:3001
+
+import os
+
+os.environ['ADMIN_ENABLED'] = '1'
+
+from app import app as application
+
+if __name__ == "__main__":
+    application.run()
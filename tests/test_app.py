@@ -0,0 +1,22 @@
+from app import create_app
+from models import db
+
+
+def test_create_app_twice_keeps_each_app_state(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'memory')
+    api_app = create_app(admin=False)
+    admin_app = create_app(admin=True)
+    for app in (api_app, admin_app):
+        with app.app_context():
+            db.create_all()
+
+    assert b'/admin/' not in api_app.test_client().get('/').data
+    assert b'/admin/' in admin_app.test_client().get('/').data
+    assert b'/admin/' not in api_app.test_client().get('/').data
+
+    api_backend = api_app.extensions['response_cache'].backend
+    admin_backend = admin_app.extensions['response_cache'].backend
+    assert api_backend is not admin_backend
+    api_app.test_client().get('/planets')
+    assert len(api_backend) == 1
+    assert len(admin_backend) == 0
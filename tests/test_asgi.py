@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+from models import db, People
+
+PATHS = ['/people', '/planets', '/users']
+
+
+def test_native_list_responses_carry_the_flask_validators(client):
+    from asgi import application
+    db.session.execute(db.insert(People.__table__), [{'name': 'Luke Skywalker', 'birth_year': '19BBY'}])
+    db.session.commit()
+
+    async def native():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as native_client:
+            for path in PATHS:
+                response = await native_client.get(path)
+                flask_response = client.get(path, headers={'Accept-Encoding': response.request.headers['accept-encoding']})
+                assert response.status_code == 200
+                assert response.json() == flask_response.json
+                assert response.headers['etag'] == flask_response.headers['ETag']
+                assert response.headers.get('last-modified') == flask_response.headers.get('Last-Modified')
+                response = await native_client.get(path, headers={'If-None-Match': response.headers['etag']})
+                assert response.status_code == 304
+                assert response.headers['etag'] == flask_response.headers['ETag']
+    asyncio.run(native())
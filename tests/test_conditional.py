@@ -0,0 +1,25 @@
+from models import db, People
+
+
+def seed():
+    db.session.add_all(People(name='person %d' % i, birth_year='1BBY') for i in range(50))
+    db.session.commit()
+
+
+def test_head_gets_the_validators_of_get(client):
+    seed()
+    response = client.head('/people')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == client.get('/people').headers['ETag']
+    assert 'Last-Modified' in response.headers
+
+
+def test_not_modified_carries_the_etag_of_the_compressed_response(client):
+    seed()
+    response = client.get('/people', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    response = client.get('/people', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
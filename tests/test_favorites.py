@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from models import db, User, People, Planets, FavoritePeople, FavoritePlanets
+
+FEW = 20
+MANY = FEW * 10
+
+
+def seed(users):
+    """ One user per favorite count in ``users``, each favorite of that many planets and people """
+    most = max(users)
+    db.session.execute(db.insert(Planets.__table__), [{'planet_name': 'planet %d' % i} for i in range(most)])
+    db.session.execute(db.insert(People.__table__), [{'name': 'person %d' % i, 'birth_year': '1BBY'}
+                                                     for i in range(most)])
+    db.session.execute(db.insert(User.__table__), [
+        {'email': 'user%d@example.com' % i, 'user_name': 'user%d' % i, 'password': 'secret', 'is_active': True}
+        for i in range(len(users))])
+    for user_id, count in enumerate(users, start=1):
+        db.session.execute(db.insert(FavoritePlanets.__table__),
+                           [{'user_fav_id': user_id, 'planet_fav_id': item_id} for item_id in range(1, count + 1)])
+        db.session.execute(db.insert(FavoritePeople.__table__),
+                           [{'user_fav_id': user_id, 'people_fav_id': item_id} for item_id in range(1, count + 1)])
+    db.session.commit()
+
+
+def count_queries(client, path):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    return response, len(statements)
+
+
+def test_user_favorites_query_count_does_not_grow_with_favorites(client):
+    seed([FEW, MANY])
+    few, few_queries = count_queries(client, '/user/favorites?user_id=1&limit=500')
+    many, many_queries = count_queries(client, '/user/favorites?user_id=2&limit=500')
+    assert len(few.json['user_favorites']['favorite_planets']) == FEW
+    assert len(many.json['user_favorites']['favorite_people']) == MANY
+    assert few_queries == many_queries
+
+
+def test_patch_favorites_rejects_ids_both_added_and_removed(client):
+    seed([FEW])
+    response = client.patch('/users/1/favorites', json={'add': {'planets': [FEW + 1, 1]}, 'remove': {'planets': [1]}})
+    assert response.status_code == 400
+    assert response.json['both'] == {'planets': [1]}
+
+    response = client.patch('/users/1/favorites', json={'add': {'people': [1]}, 'remove': {'planets': [1]}})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['results']] == ['unchanged', 'removed']
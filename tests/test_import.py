@@ -0,0 +1,54 @@
+import os
+
+from models import db, User, People, Planets, FavoritePeople, FavoritePlanets
+
+DOCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs')
+
+
+def import_docs(app, directory=DOCS):
+    result = app.test_cli_runner().invoke(args=['catalog', 'import', str(directory)])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def favorite_names(model, item_model, name):
+    stmt = db.select(User.email, name).select_from(model).join(User, User.id == model.user_fav_id) \
+        .join(item_model, item_model.id == getattr(model, model.item_column))
+    return sorted(db.session.execute(stmt).all())
+
+
+def test_import_matches_rows_on_their_name_not_their_csv_id(app, client):
+    response = client.post('/people', json={'name': 'Din Djarin', 'birth_year': '9ABY', 'gender': 'male',
+                                             'height': '180', 'hair_color': 'brown'})
+    assert response.status_code == 200
+    import_docs(app)
+    people = db.session.execute(db.select(db.func.count()).select_from(People)).scalar()
+    favorites = favorite_names(FavoritePeople, People, People.name), \
+        favorite_names(FavoritePlanets, Planets, Planets.planet_name)
+    assert favorites[0] and favorites[1]
+
+    import_docs(app)
+    assert db.session.execute(db.select(db.func.count()).select_from(People)).scalar() == people
+    assert (favorite_names(FavoritePeople, People, People.name),
+            favorite_names(FavoritePlanets, Planets, Planets.planet_name)) == favorites
+
+
+def test_import_skips_favorites_already_there_under_another_id(app):
+    import_docs(app)
+    favorite = db.session.execute(db.select(FavoritePlanets).order_by(FavoritePlanets.id)).scalars().first()
+    favorite.id = 100
+    db.session.commit()
+    favorites = favorite_names(FavoritePlanets, Planets, Planets.planet_name)
+
+    import_docs(app)
+    assert favorite_names(FavoritePlanets, Planets, Planets.planet_name) == favorites
+
+
+def test_import_creates_unmatched_homeworlds_and_leaves_placeholders_empty(app, tmp_path):
+    (tmp_path / 'people.csv').write_text('id,name,birth_year,homeworld\n'
+                                         '1,Rey,15ABY,Jakku\n2,Yoda,896BBY,unknown\n3,R2-D2,33BBY,n/a\n')
+    import_docs(app, tmp_path)
+    homeworlds = db.session.execute(db.select(People.name, Planets.planet_name)
+                                    .outerjoin(Planets, Planets.id == People.homeworld_id).order_by(People.id)).all()
+    assert homeworlds == [('Rey', 'Jakku'), ('Yoda', None), ('R2-D2', None)]
+    assert db.session.execute(db.select(Planets.planet_name)).scalars().all() == ['Jakku']
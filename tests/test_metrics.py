@@ -0,0 +1,17 @@
+from models import db, People
+
+
+def test_failed_statements_leave_no_start_time_on_pooled_connections(client):
+    db.session.execute(db.insert(People.__table__), [{'name': 'person %d' % i, 'birth_year': '1BBY'} for i in range(2)])
+    db.session.commit()
+    db.session.close()
+    for _ in range(3):
+        # the UPDATE fails on the unique name
+        assert client.patch('/people/2', json={'name': 'person 0'}).status_code == 409
+
+    connections = [db.engine.connect() for _ in range(db.engine.pool.size())]
+    try:
+        assert not any(connection.connection.info.get('metrics_started') for connection in connections)
+    finally:
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,16 @@
+from models import db, People, Planets
+
+
+def test_planet_residents_next_link_keeps_the_planet(client):
+    db.session.execute(db.insert(Planets.__table__), [{'planet_name': 'planet %d' % i} for i in range(2)])
+    db.session.execute(db.insert(People.__table__), [
+        {'name': 'person %d' % i, 'birth_year': '1BBY', 'homeworld_id': 1 + i % 2} for i in range(10)])
+    db.session.commit()
+
+    names, path = [], '/planets/1/residents?limit=2'
+    while path:
+        response = client.get(path)
+        assert response.status_code == 200
+        names += [person['name'] for person in response.json['people']]
+        path = response.json['next']
+    assert names == ['person %d' % i for i in range(0, 10, 2)]
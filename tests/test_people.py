@@ -0,0 +1,18 @@
+from models import db, People, Planets
+
+PERSON = {'name': 'Luke Skywalker', 'birth_year': '19BBY', 'gender': 'male', 'height': '172', 'hair_color': 'blond'}
+
+
+def test_unknown_homeworld_id_is_rejected_before_the_write(client):
+    db.session.execute(db.insert(Planets.__table__), [{'planet_name': 'Tatooine'}])
+    db.session.commit()
+    for method in (client.post, client.put):
+        response = method('/people', json={**PERSON, 'homeworld_id': 99})
+        assert response.status_code == 400
+    response = client.post('/people/batch', json=[{**PERSON, 'homeworld_id': 99}, {**PERSON, 'name': 'Leia Organa',
+                                                                                    'homeworld_id': 1}])
+    assert [result['status'] for result in response.json['results']] == ['error', 'created']
+
+    assert client.post('/people', json={**PERSON, 'homeworld': 'Tatooine'}).status_code == 200
+    person = db.session.execute(db.select(People).filter_by(name=PERSON['name'])).scalar_one()
+    assert person.homeworld_id == 1